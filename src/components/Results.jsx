@@ -11,6 +11,8 @@ const API_BASE = process.env.REACT_APP_API_BASE || 'http://localhost:3001';
 const RESULTS_ENDPOINT = RESULTS;
 const LOG_ENDPOINT = LOG;
 const ACTIVITY_ENDPOINT = ACTIVITY;
+// Rows requested per page; the server reads only that slice of the ranking.
+const PAGE_SIZE = 100;
 
 const Results = () => {
   const navigate = useNavigate();
@@ -22,8 +24,12 @@ const Results = () => {
   const [error, setError] = useState('');
   const [submitting, setSubmitting] = useState(false);
   const [csvFile, setCsvFile] = useState(null);
+  const [offset, setOffset] = useState(0);
+  const [total, setTotal] = useState(0);
+  const [topRow, setTopRow] = useState(null);
 
   const pollRef = useRef(null);
+  const offsetRef = useRef(0);
 
   // fire-and-forget activity logger
   const ping = (event, meta = {}) =>
@@ -45,7 +51,8 @@ const Results = () => {
       if (!fromPoll) setLoading(true);
       setError('');
 
-      const res = await fetch(RESULTS_ENDPOINT, { headers: { 'Content-Type': 'application/json', 'x-session-id': sessionId } });
+      const pageUrl = `${RESULTS_ENDPOINT}?offset=${offsetRef.current}&limit=${PAGE_SIZE}`;
+      const res = await fetch(pageUrl, { headers: { 'Content-Type': 'application/json', 'x-session-id': sessionId } });
 
       if (res.status === 202) {
         setStateMsg('Computing ranking…');
@@ -53,6 +60,13 @@ const Results = () => {
         return;
       }
 
+      if (res.status === 409) {
+        // Dataset changed after this ranking; the server is ranking again.
+        setStateMsg('Data changed, recomputing ranking…');
+        setLoading(true);
+        return;
+      }
+
       if (res.status === 404) {
         setStateMsg('No results available yet.');
         setLoading(false);
@@ -65,7 +79,7 @@ const Results = () => {
 
       const data = await res.json();
 
-      // Expect: { ok: true, state: 'done', csv: '...', rows: <count> }
+      // Expect: { ok: true, state: 'done', csv: '...', total, offset, rows: [...] }
       if (!data || !data.csv) {
         setStateMsg('No results CSV found.');
         setLoading(false);
@@ -77,6 +91,12 @@ const Results = () => {
       } else{
 	setRows([]);
       }
+      const pageOffset = data.offset || 0;
+      if (pageOffset === 0) {
+        setTopRow(Array.isArray(data.rows) && data.rows.length ? data.rows[0] : null);
+      }
+      setOffset(pageOffset);
+      setTotal(typeof data.total === 'number' ? data.total : 0);
       setCsvFile(data.csv);
       setLoading(false);
       setStateMsg('');
@@ -100,14 +120,21 @@ const Results = () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  const goToPage = (nextOffset) => {
+    if (nextOffset < 0 || nextOffset >= total || nextOffset === offset) return;
+    offsetRef.current = nextOffset;
+    ping('results_page_changed', { offset: nextOffset, limit: PAGE_SIZE });
+    tick({ fromPoll: false }).catch(() => {});
+  };
+
   const handleNext = async () => {
     if (!selectedRow || rows.length === 0) return;
     setSubmitting(true);
 
     const selectedRowLocal = selectedRow;
     const idx = rows.findIndex((r) => r === selectedRowLocal);
-    const selectedIndex = idx >= 0 ? idx : null;
-    const topRow = rows[0];
+    // Rank in the whole list, not on the current page
+    const selectedIndex = idx >= 0 ? offset + idx : null;
 
     const now = Date.now();
     const mdpStartStr = localStorage.getItem('mdp_start_time');
@@ -220,11 +247,43 @@ const Results = () => {
           </div>
         )}
 
+        {!loading && !error && csvFile && total > PAGE_SIZE && (
+          <div
+            style={{
+              marginTop: '1rem',
+              display: 'flex',
+              alignItems: 'center',
+              gap: '0.75rem',
+              fontSize: '0.9rem',
+            }}
+          >
+            <button
+              type="button"
+              onClick={() => goToPage(offset - PAGE_SIZE)}
+              disabled={offset === 0}
+              style={{ borderRadius: '6px', padding: '0.3rem 0.9rem', border: '1px solid #CBD5E1' }}
+            >
+              Previous
+            </button>
+            <span>
+              Models {offset + 1}–{Math.min(offset + rows.length, total)} of {total}
+            </span>
+            <button
+              type="button"
+              onClick={() => goToPage(offset + PAGE_SIZE)}
+              disabled={offset + PAGE_SIZE >= total}
+              style={{ borderRadius: '6px', padding: '0.3rem 0.9rem', border: '1px solid #CBD5E1' }}
+            >
+              Next page
+            </button>
+          </div>
+        )}
+
         {!loading && !error && csvFile && (
           <div style={{ marginTop: '1.5rem' }}>
             <DataTable
 	      rows={rows}
-              csvUrl={rows.length ? null: `${API_BASE}/logs/page2/${csvFile}`}
+              csvUrl={rows.length ? null : `${API_BASE}/page2/results.csv?sessionId=${encodeURIComponent(sessionId)}`}
               showFieldFilter={false}
               selectedRow={selectedRow}
               onDataLoaded={(data) => {
@@ -237,7 +296,7 @@ const Results = () => {
                 setSelectedRow(row);
 
                 const idx = rows.findIndex((r) => r === row);
-                const index = idx >= 0 ? idx : null;
+                const index = idx >= 0 ? offset + idx : null;
 
                 ping('results_row_selected', {
                   index,
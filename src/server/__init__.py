@@ -4,4 +4,6 @@ from .initial_transition_generator import generate_initial_transition_model
 from .utils import Utils
 from .hard import generate_hard_constraints
 from .soft import generate_soft_constraints
-from .soft import generate_reward_values
\ No newline at end of file
+from .soft import generate_reward_values
+from .threshold import ThresholdIndex
+from .dataset import load_dataset
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Explicit schema for the model catalogue. Columns that are missing from a
+# file are ignored; columns not listed keep pandas' inferred dtype.
+CATEGORICAL_COLUMNS = [
+    "field", "domain", "intent", "algorithm", "model", "processing_unit",
+]
+# Metrics only feed min-max normalization and ranking, float32 is plenty.
+METRIC_COLUMNS = [
+    "accuracy", "precision", "recall", "f1_score", "loss", "training_time",
+]
+# Small integer hyper-parameters, downcast to the narrowest integer type.
+SMALL_INT_COLUMNS = [
+    "epochs", "RAM", "batch_size", "pool_size", "kernel_size", "layers", "nodes",
+]
+
+
+def dataset_version(path: str) -> str:
+    """Cheap version tag for a dataset file (size + mtime), for cache/result validation."""
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def memory_by_column(df: pd.DataFrame) -> dict:
+    """Bytes used by every column (deep, i.e. including string payloads)."""
+    return {col: int(n) for col, n in df.memory_usage(deep=True, index=False).items()}
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert ``df`` to the compact schema (modified in place and returned):
+      • CATEGORICAL_COLUMNS → pandas ``category`` (int codes + one shared dictionary)
+      • METRIC_COLUMNS      → float32
+      • SMALL_INT_COLUMNS   → narrowest integer type (float32 if there are NaNs)
+
+    Numeric conversions only touch columns pandas already parsed as numbers,
+    so list-like strings such as "[16, 16, 16, 16]" are left untouched.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    for col in METRIC_COLUMNS:
+        if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype(np.float32)
+
+    for col in SMALL_INT_COLUMNS:
+        if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        s = df[col]
+        if s.isna().any() or not np.all(np.mod(s.to_numpy(), 1) == 0):
+            df[col] = s.astype(np.float32)
+        else:
+            df[col] = pd.to_numeric(s.astype(np.int64), downcast="integer")
+
+    return df
+
+
+def load_dataset(path: str, report: bool = False) -> pd.DataFrame:
+    """
+    Read the catalogue CSV with the compact schema.
+
+    Categorical columns are parsed straight into ``category`` so no object
+    column is ever materialised. With ``report=True`` the file is also read
+    the plain ``pd.read_csv`` way and per-column bytes before/after are
+    printed (this doubles the load cost, so keep it for diagnostics).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        header = pd.read_csv(f, nrows=0).columns
+    dtypes = {col: "category" for col in CATEGORICAL_COLUMNS if col in header}
+
+    df = apply_schema(pd.read_csv(path, dtype=dtypes))
+
+    if report:
+        before = memory_by_column(pd.read_csv(path))
+        after = memory_by_column(df)
+        print(f"[dataset] {'column':<20}{'before':>14}{'after':>14}")
+        for col in df.columns:
+            print(f"[dataset] {col:<20}{before.get(col, 0):>14,}{after[col]:>14,}")
+        total_before, total_after = sum(before.values()), sum(after.values())
+        print(
+            f"[dataset] {'total':<20}{total_before:>14,}{total_after:>14,}"
+            f"  ({total_before / max(total_after, 1):.1f}x smaller)"
+        )
+
+    return df
@@ -0,0 +1,563 @@
+import argparse
+import json
+import os
+import sys
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from dataset import CATEGORICAL_COLUMNS, METRIC_COLUMNS, SMALL_INT_COLUMNS, dataset_version, load_dataset
+from utils import Utils, range_bounds
+
+
+FORMAT_VERSION = 3
+# Dims with more distinct values than this (e.g. ``model``) are rolled up:
+# they get a (cell, value) count table instead of splitting the cells.
+MAX_LEVELS = 256
+
+
+def cache_path(dataset_path: str) -> str:
+    """Where the cube of a dataset is persisted (next to the dataset file)."""
+    return f"{dataset_path}.facets.npz"
+
+
+def _json_label(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class FacetCube:
+    """
+    Precomputed aggregates for the constraint UI ("N models match", valid
+    values, feasible ranges) that never touch the raw rows at query time.
+
+    The cube is sparse: one cell per combination of the low-cardinality
+    ``dims`` (the architecture hierarchy plus the categorical constraint
+    columns) that occurs in the data. Every cell stores its row count and,
+    for each numeric ``metrics`` column, the min and max. Continuous metrics
+    add a histogram over bins shared by all cells (counts in the smallest
+    unsigned type that fits); histograms add up, so any set of cells can be
+    merged into one to read quantiles. Integer metrics with at most
+    ``max_levels`` distinct values (RAM, epochs, batch_size, ...) keep exact
+    row counts per (cell, value) instead.
+
+    Dims with more than ``max_levels`` distinct values (a near-unique
+    ``model`` column would make every row its own cell) are rolled up: they
+    only keep how many rows of each cell have each value.
+
+    Queries take a ``constraints_map`` in the ``Utils.filter_dataFrame``
+    format:
+
+    - Constraints on ``dims`` are exact. They are evaluated with
+      ``Utils.constraint_mask`` on each dimension's distinct values. A
+      rolled-up dim selects a share of each cell; combined with a metric
+      range that straddles the same cell the count is estimated.
+    - Constraints on integer metrics with per-value counts select a share
+      of each cell like a rolled-up dim.
+    - Range constraints on continuous ``metrics`` are exact for cells that
+      lie wholly inside or outside the range. Cells that straddle a bound are
+      estimated from their histogram, and independence is assumed across
+      metrics; the ``exact`` flag reports when that happened.
+    - Constraints on other columns are ignored and listed in ``ignored``.
+    """
+
+    def __init__(self, df: pd.DataFrame, dims, metrics=None, bins: int = 32, max_levels: int = MAX_LEVELS):
+        if bins <= 0:
+            raise ValueError("bins must be a positive integer.")
+        self.dims = [c for c in dict.fromkeys(dims) if c in df.columns]
+        self.max_levels = int(max_levels)
+        if metrics is None:
+            metrics = METRIC_COLUMNS + SMALL_INT_COLUMNS
+        self.metrics = [
+            c for c in dict.fromkeys(metrics)
+            if c in df.columns and c not in self.dims and pd.api.types.is_numeric_dtype(df[c])
+        ]
+        self.bins = int(bins)
+        self.row_count = len(df)
+
+        # --- 1. dimension codes and their labels ---
+        dim_codes = {}
+        self.labels = {}
+        for dim in self.dims:
+            col_codes, _ = pd.factorize(df[dim], use_na_sentinel=False)
+            _, first = np.unique(col_codes, return_index=True)
+            dim_codes[dim] = col_codes
+            # Real values of the column (same dtype) so constraint_mask
+            # treats them exactly like the filter treats the rows.
+            self.labels[dim] = df[dim].iloc[first].reset_index(drop=True)
+        self.cell_dims = [d for d in self.dims if len(self.labels[d]) <= self.max_levels]
+        self.rolled_dims = [d for d in self.dims if d not in self.cell_dims]
+
+        # --- 2. cells = occurring combinations of the cell dims ---
+        codes = np.zeros((len(df), len(self.cell_dims)), dtype=np.int64)
+        for j, dim in enumerate(self.cell_dims):
+            codes[:, j] = dim_codes[dim]
+        if len(df):
+            self.cells, inverse = np.unique(codes, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            self.cells, inverse = codes, np.zeros(0, dtype=np.int64)
+        num_cells = len(self.cells)
+        self.counts = np.bincount(inverse, minlength=num_cells).astype(np.int64)
+        count_dtype = np.uint16 if len(df) <= np.iinfo(np.uint16).max else np.uint32
+
+        # Rolled-up dims: rows per (cell, value) pair that occurs
+        self.pairs = {}
+        for dim in self.rolled_dims:
+            pair_keys, pair_counts = np.unique(
+                inverse * len(self.labels[dim]) + dim_codes[dim], return_counts=True
+            )
+            self.pairs[dim] = (
+                (pair_keys // len(self.labels[dim])).astype(np.int32),
+                (pair_keys % len(self.labels[dim])).astype(np.int32),
+                pair_counts.astype(count_dtype),
+            )
+
+        order = np.argsort(inverse, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(inverse[order]) != 0]) if len(df) else order
+
+        # --- 3. per cell and metric: min, max, histogram or per-value counts ---
+        self.metric_dtypes = {}
+        self.mins = np.full((num_cells, len(self.metrics)), np.nan)
+        self.maxs = np.full((num_cells, len(self.metrics)), np.nan)
+        self.levels, self.level_pairs = {}, {}
+        metric_values = {}
+
+        for m, col in enumerate(self.metrics):
+            self.metric_dtypes[col] = str(df[col].dtype)
+            values = metric_values[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            if np.isnan(values).all():
+                continue
+            # fmin/fmax skip NaNs unless a whole cell is NaN
+            self.mins[:, m] = np.fmin.reduceat(values[order], starts)
+            self.maxs[:, m] = np.fmax.reduceat(values[order], starts)
+
+            # Few integer values: a histogram bin would cut through a value
+            col_codes, _ = pd.factorize(df[col])
+            valid = col_codes >= 0
+            num_levels = int(col_codes.max()) + 1
+            if num_levels <= self.max_levels and np.array_equal(values[valid], np.round(values[valid])):
+                _, first = np.unique(col_codes[valid], return_index=True)
+                self.levels[col] = df[col].iloc[np.flatnonzero(valid)[first]].reset_index(drop=True)
+                pair_keys, pair_counts = np.unique(
+                    inverse[valid] * num_levels + col_codes[valid], return_counts=True
+                )
+                self.level_pairs[col] = (
+                    (pair_keys // num_levels).astype(np.int32),
+                    (pair_keys % num_levels).astype(np.int32),
+                    pair_counts.astype(count_dtype),
+                )
+
+        self.continuous = [c for c in self.metrics if c not in self.levels]
+        self.edges = np.zeros((len(self.continuous), self.bins + 1))
+        self.hist = np.zeros((num_cells, len(self.continuous), self.bins), dtype=count_dtype)
+        for h, col in enumerate(self.continuous):
+            values = metric_values[col]
+            valid = ~np.isnan(values)
+            if not valid.any():
+                continue
+            lo, hi = float(values[valid].min()), float(values[valid].max())
+            self.edges[h] = np.linspace(lo, hi, self.bins + 1)
+
+            width = (hi - lo) / self.bins
+            b = np.zeros(valid.sum(), dtype=np.int64)
+            if width > 0:
+                b = np.clip(((values[valid] - lo) / width).astype(np.int64), 0, self.bins - 1)
+            flat = np.bincount(inverse[valid] * self.bins + b, minlength=num_cells * self.bins)
+            self.hist[:, h, :] = flat.reshape(num_cells, self.bins).astype(count_dtype)
+
+        self.dataset = None
+        self.dataset_version = None
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def save(self, path: str):
+        """Write the cube to ``path`` (``.npz``), atomically."""
+        meta = {
+            "format": FORMAT_VERSION,
+            "dims": self.dims,
+            "cell_dims": self.cell_dims,
+            "rolled_dims": self.rolled_dims,
+            "max_levels": self.max_levels,
+            "metrics": self.metrics,
+            "continuous": self.continuous,
+            "bins": self.bins,
+            "row_count": self.row_count,
+            "metric_dtypes": self.metric_dtypes,
+            "labels": {d: [_json_label(v) for v in s] for d, s in self.labels.items()},
+            "levels": {c: [_json_label(v) for v in s] for c, s in self.levels.items()},
+            "label_categorical": {
+                d: isinstance(s.dtype, pd.CategoricalDtype) for d, s in self.labels.items()
+            },
+            "dataset": self.dataset,
+            "dataset_version": self.dataset_version,
+        }
+        pairs = {}
+        for i, dim in enumerate(self.rolled_dims):
+            pairs[f"pair_cell_{i}"], pairs[f"pair_label_{i}"], pairs[f"pair_count_{i}"] = self.pairs[dim]
+        for i, col in enumerate(self.levels):
+            pairs[f"level_cell_{i}"], pairs[f"level_value_{i}"], pairs[f"level_count_{i}"] = self.level_pairs[col]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                meta=np.array(json.dumps(meta)),
+                **pairs,
+                cells=self.cells,
+                counts=self.counts,
+                edges=self.edges,
+                mins=self.mins,
+                maxs=self.maxs,
+                hist=self.hist,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FacetCube":
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported facet cube format in {path}.")
+            cube = cls.__new__(cls)
+            cube.cells, cube.counts, cube.edges = z["cells"], z["counts"], z["edges"]
+            cube.mins, cube.maxs, cube.hist = z["mins"], z["maxs"], z["hist"]
+            cube.pairs = {
+                dim: (z[f"pair_cell_{i}"], z[f"pair_label_{i}"], z[f"pair_count_{i}"])
+                for i, dim in enumerate(meta["rolled_dims"])
+            }
+            cube.level_pairs = {
+                col: (z[f"level_cell_{i}"], z[f"level_value_{i}"], z[f"level_count_{i}"])
+                for i, col in enumerate(meta["levels"])
+            }
+
+        cube.dims, cube.metrics, cube.bins = meta["dims"], meta["metrics"], meta["bins"]
+        cube.continuous = meta["continuous"]
+        cube.cell_dims, cube.rolled_dims = meta["cell_dims"], meta["rolled_dims"]
+        cube.max_levels = meta["max_levels"]
+        cube.row_count = meta["row_count"]
+        cube.metric_dtypes = meta["metric_dtypes"]
+        cube.labels = {
+            d: pd.Series(values, dtype="category" if meta["label_categorical"][d] else None)
+            for d, values in meta["labels"].items()
+        }
+        cube.levels = {
+            c: pd.Series(values, dtype=cube.metric_dtypes[c]) for c, values in meta["levels"].items()
+        }
+        cube.dataset, cube.dataset_version = meta["dataset"], meta["dataset_version"]
+        return cube
+
+    @classmethod
+    def load_or_build(
+        cls, dataset_path: str, dims, metrics=None, bins: int = 32, max_levels: int = MAX_LEVELS, df=None
+    ) -> "FacetCube":
+        """
+        Cached cube for ``dataset_path``. It is rebuilt (and saved again) when
+        the dataset version or the requested dims/metrics/bins/max_levels changed.
+        """
+        path = cache_path(dataset_path)
+        version = dataset_version(dataset_path)
+        if os.path.exists(path):
+            try:
+                cube = cls.load(path)
+                wanted_metrics = cube.metrics if metrics is None else list(metrics)
+                if (
+                    cube.dataset_version == version
+                    and cube.dims == list(dict.fromkeys(dims))
+                    and cube.metrics == wanted_metrics
+                    and cube.bins == bins
+                    and cube.max_levels == max_levels
+                ):
+                    return cube
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[facets] Rebuilding unreadable cube {path}: {e}", file=sys.stderr)
+
+        if df is None:
+            df = load_dataset(dataset_path)
+        cube = cls(df, dims, metrics=metrics, bins=bins, max_levels=max_levels)
+        cube.dataset, cube.dataset_version = os.path.abspath(dataset_path), version
+        try:
+            cube.save(path)
+        except OSError as e:
+            print(f"[facets] Could not persist cube to {path}: {e}", file=sys.stderr)
+        return cube
+
+    def is_current(self) -> bool:
+        """False when the dataset changed since the cube was built."""
+        return (
+            self.dataset is not None
+            and os.path.exists(self.dataset)
+            and dataset_version(self.dataset) == self.dataset_version
+        )
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    @cached_property
+    def _columns(self):
+        """Empty frame with the cube's columns, for ``Utils._resolve_col``."""
+        return pd.DataFrame(columns=self.dims + self.metrics)
+
+    @cached_property
+    def _names(self):
+        """{dim: value labels as strings}, for the facet dicts."""
+        return {dim: [str(_json_label(v)) for v in labels] for dim, labels in self.labels.items()}
+
+    def _resolve(self, constraints_map):
+        """Split constraints into dim / metric / ignored, keyed by cube column."""
+        resolved, ignored = {}, []
+        for raw_col, cond in (constraints_map or {}).items():
+            col = Utils._resolve_col(self._columns, raw_col)
+            if col is None:
+                ignored.append(raw_col)
+            else:
+                resolved[col] = cond
+        return resolved, ignored
+
+    def _pair_share(self, pairs, mask):
+        """Per cell: share of rows whose (cell, value) pair has ``mask[value]``, and where it is partial."""
+        pair_cell, pair_value, pair_count = pairs
+        matched = np.bincount(pair_cell, weights=pair_count * mask[pair_value], minlength=len(self.counts))
+        share = matched / np.maximum(self.counts, 1)
+        return share, (share > 0) & (share < 1)
+
+    def _range_fraction(self, col, low, high):
+        """Per cell: share of rows with ``low <= col <= high`` for a continuous metric (and where it is partial)."""
+        m, h = self.metrics.index(col), self.continuous.index(col)
+        if self.metric_dtypes[col] == "float32":
+            # The filter compares float32 columns in float32.
+            low, high = (float(np.float32(v)) for v in (low, high))
+
+        nonnull = self.hist[:, h, :].sum(axis=1)
+        mins, maxs = self.mins[:, m], self.maxs[:, m]
+        with np.errstate(invalid="ignore"):
+            inside = (mins >= low) & (maxs <= high)
+            outside = (nonnull == 0) | (maxs < low) | (mins > high)
+
+        edges = self.edges[h]
+        width = edges[1:] - edges[:-1]
+        overlap = np.minimum(edges[1:], high) - np.maximum(edges[:-1], low)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(width > 0, np.clip(overlap / width, 0.0, 1.0), 0.0)
+        estimate = self.hist[:, h, :] @ share
+
+        matched = np.where(inside, nonnull, np.where(outside, 0.0, estimate))
+        frac = matched / np.maximum(self.counts, 1)
+        partial = ~inside & ~outside
+        return frac, partial
+
+    def _factors(self, resolved):
+        """
+        One entry per constraint: (column, per-cell share of rows that pass
+        it, cells where that share is partial, whether it is estimated).
+        The share is None for a constraint that cannot be aggregated.
+        """
+        factors = []
+        for col, cond in resolved.items():
+            if col in self.labels:
+                mask = Utils.constraint_mask(self.labels[col], cond)
+                if mask is None:
+                    continue
+                mask = mask.to_numpy(dtype=bool)
+                if col in self.pairs:
+                    share, partial = self._pair_share(self.pairs[col], mask)
+                    factors.append((col, share, partial, False))
+                else:
+                    share = mask[self.cells[:, self.cell_dims.index(col)]].astype(float)
+                    factors.append((col, share, None, False))
+                continue
+
+            if col in self.levels:
+                # Exact per cell, like a rolled-up dim
+                mask = Utils.constraint_mask(self.levels[col], cond)
+                if mask is None:
+                    continue
+                share, partial = self._pair_share(self.level_pairs[col], mask.to_numpy(dtype=bool))
+                factors.append((col, share, partial, False))
+                continue
+
+            bounds = range_bounds(cond)
+            if bounds is None:
+                factors.append((col, None, None, True))  # set membership on a metric
+                continue
+            share, partial = self._range_fraction(col, *bounds)
+            factors.append((col, share, partial, True))
+        return factors
+
+    def _weights(self, factors, skip=None):
+        """
+        Matching rows per cell under ``factors`` minus the ``skip`` column, and
+        whether that is exact. Shares of different constraints are multiplied,
+        so a count is estimated where a histogram share is partial, or where
+        two partial shares meet in one cell.
+        """
+        weights = self.counts.astype(float)
+        estimated = np.zeros(len(weights), dtype=bool)
+        partial_count = np.zeros(len(weights), dtype=np.int64)
+        exact = True
+        for col, share, partial, is_estimate in factors:
+            if col == skip:
+                continue
+            if share is None:
+                exact = False
+                continue
+            weights *= share
+            if partial is not None:
+                partial_count += partial
+                if is_estimate:
+                    estimated |= partial
+        live = weights > 0
+        exact = exact and not np.any(live & (estimated | (partial_count > 1)))
+        return weights, exact
+
+    def match_count(self, constraints_map: dict):
+        """(rows matching ``constraints_map``, exact)."""
+        resolved, _ = self._resolve(constraints_map)
+        weights, exact = self._weights(self._factors(resolved))
+        return int(round(weights.sum())), exact
+
+    def _facet_totals(self, dim, factors):
+        """Matching rows per value of ``dim`` under every constraint except its own."""
+        weights, _ = self._weights(factors, skip=dim)
+        if dim in self.pairs:
+            pair_cell, pair_label, pair_count = self.pairs[dim]
+            share = weights / np.maximum(self.counts, 1)
+            totals = np.bincount(pair_label, weights=pair_count * share[pair_cell], minlength=len(self.labels[dim]))
+        else:
+            totals = np.bincount(
+                self.cells[:, self.cell_dims.index(dim)], weights=weights, minlength=len(self.labels[dim])
+            )
+        return np.round(totals).astype(np.int64)
+
+    def facet_counts(self, constraints_map: dict, dims=None, factors=None, limit: int = MAX_LEVELS) -> dict:
+        """
+        {dim: {value: rows}}. Each dim is counted under every constraint except
+        its own, so the UI can show what picking another value would give.
+        Rolled-up dims list at most ``limit`` values, those with the most rows.
+        """
+        if factors is None:
+            factors = self._factors(self._resolve(constraints_map)[0])
+        out = {}
+        for dim in dims or self.dims:
+            totals = self._facet_totals(dim, factors)
+            if dim in self.pairs:
+                shown = np.flatnonzero(totals > 0)
+                shown = shown[np.argsort(-totals[shown], kind="stable")[:limit]]
+            else:
+                shown = np.arange(len(totals))
+            names = self._names[dim]
+            out[dim] = {names[i]: int(totals[i]) for i in shown}
+        return out
+
+    def feasible_ranges(self, constraints_map: dict, quantiles=(0.1, 0.5, 0.9), factors=None) -> dict:
+        """
+        {metric: {"min", "max", "p10", ...}} over the rows matching every
+        constraint except the metric's own. min/max are exact under dim
+        constraints and an outer bound when other metrics are constrained.
+        Quantiles come from the merged histograms (accurate to about one
+        bin), or from the per-value counts of integer metrics (a value of the
+        column). A metric with no matching values maps to None.
+        """
+        if factors is None:
+            factors = self._factors(self._resolve(constraints_map)[0])
+        out = {}
+        for m, col in enumerate(self.metrics):
+            weights, _ = self._weights(factors, skip=col)
+            hit = (weights > 0) & ~np.isnan(self.mins[:, m])
+            if not hit.any():
+                out[col] = None
+                continue
+
+            entry = {"min": float(self.mins[hit, m].min()), "max": float(self.maxs[hit, m].max())}
+            if col in self.levels:
+                pair_cell, pair_value, pair_count = self.level_pairs[col]
+                share = weights / np.maximum(self.counts, 1)
+                merged = np.bincount(pair_value, weights=pair_count * share[pair_cell], minlength=len(self.levels[col]))
+                values = self.levels[col].to_numpy(dtype=float)
+                present = np.flatnonzero(merged > 0)
+                present = present[np.argsort(values[present], kind="stable")]
+                cum = np.cumsum(merged[present])
+                if len(cum):
+                    for q in quantiles:
+                        pick = min(np.searchsorted(cum, q * cum[-1]), len(cum) - 1)
+                        entry[f"p{round(100 * q)}"] = float(values[present[pick]])
+                out[col] = entry
+                continue
+
+            h = self.continuous.index(col)
+            scale = weights[hit] / self.counts[hit]
+            merged = scale @ self.hist[hit, h, :]
+            cum = np.concatenate([[0.0], np.cumsum(merged)])
+            if cum[-1] > 0:
+                edges = self.edges[h]
+                for q in quantiles:
+                    value = float(np.interp(q * cum[-1], cum, edges))
+                    entry[f"p{round(100 * q)}"] = min(max(value, entry["min"]), entry["max"])
+            out[col] = entry
+        return out
+
+    def query(self, constraints_map: dict) -> dict:
+        """Everything the constraints page needs, JSON-ready."""
+        resolved, ignored = self._resolve(constraints_map)
+        factors = self._factors(resolved)
+        weights, exact = self._weights(factors)
+        return {
+            "rows": int(round(weights.sum())),
+            "exact": exact,
+            "total": self.row_count,
+            "facets": self.facet_counts(constraints_map, factors=factors),
+            # values with matching rows, for the truncated rolled-up facets
+            "distinct": {
+                dim: int(np.count_nonzero(self._facet_totals(dim, factors))) for dim in self.rolled_dims
+            },
+            "ranges": self.feasible_ranges(constraints_map, factors=factors),
+            "ignored": ignored,
+        }
+
+
+def default_dims(arch_cols, df_columns):
+    """Architecture levels first, then the remaining categorical constraint columns."""
+    return list(dict.fromkeys(list(arch_cols) + [c for c in CATEGORICAL_COLUMNS if c in df_columns]))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Facet counts / feasible ranges from a precomputed cube")
+    p.add_argument("dataset", help="Path to dataset CSV (the cube is cached next to it)")
+    p.add_argument(
+        "--arch-cols",
+        nargs="+",
+        default=["domain", "algorithm", "model"],
+        help="Model architecture columns (cube dimensions, before the categorical columns)",
+    )
+    p.add_argument("--bins", type=int, default=32, help="Histogram bins per metric")
+    p.add_argument("--constraints-json", default=None, help="Answer one query for this constraints file")
+    p.add_argument(
+        "--serve",
+        action="store_true",
+        help="Answer JSON lines {\"constraints_map\": {...}} from stdin, one JSON line each",
+    )
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    header = pd.read_csv(args.dataset, nrows=0).columns
+    dims = default_dims(args.arch_cols, header)
+    cube = FacetCube.load_or_build(args.dataset, dims, bins=args.bins)
+
+    if args.constraints_json:
+        with open(args.constraints_json, "r", encoding="utf-8") as f:
+            constraints_map = json.load(f).get("constraints_map", {})
+        print(json.dumps(cube.query(constraints_map)))
+
+    if args.serve:
+        for line in sys.stdin:
+            try:
+                reply = cube.query(json.loads(line).get("constraints_map", {}))
+            except (ValueError, AttributeError, TypeError) as e:
+                reply = {"error": str(e)}
+            print(json.dumps(reply), flush=True)
@@ -1,16 +1,41 @@
+import argparse
+import heapq
+import json
+import os
+import sys
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
+
+from dataset import dataset_version
 
 class GraphWorld():
-    def __init__(self, data , probability_file_name, constraints , reward_values):
+    def __init__(self, data , probability_file_name, constraints , reward_values, dtype=np.float64):
 
+        # dtype of the transition model and reward vector; np.float32 halves
+        # their memory (PolicyIteration refines the result in float64).
+        self.dtype = np.dtype(dtype)
         self.data = data
-        self.probability_matrix = pd.read_csv(probability_file_name , index_col=0)
+
+        # Lazily filled caches that only depend on the graph and ``data``:
+        # per-column reward data (``_reward_column``), the edge arrays
+        # (``_subtree_structure``), the leaf -> row mapping per label column
+        # (``leaf_rows``) and per-state bounds derived from ``subtree_bounds``
+        # by callers (main.graph_contribution_bounds).
+        self._reward_columns = {}
+        self._structure = None
+        self._leaf_maps = {}
+        self.contribution_bounds = {}
+
+        # Parsed straight into ``dtype``: no float64 copy of the matrix in float32 mode
+        labels = pd.read_csv(probability_file_name, index_col=0, nrows=0).columns
+        self.probability_matrix = pd.read_csv(
+            probability_file_name, index_col=0, dtype={label: self.dtype for label in labels}
+        )
         self.num_states = self.probability_matrix.shape[0]
         self.num_actions = self.probability_matrix.shape[0] - 1 
-        self.reward_function = self.get_reward_function(self.data , constraints , reward_values)
+        self.reward_function = self.get_reward_function(self.data , constraints , reward_values).astype(self.dtype)
         self.transition_model = self.probability_matrix.to_numpy()
 
         self.states = self.__get_states__()
@@ -117,6 +142,10 @@ class GraphWorld():
 
 
     def get_rewards(self, data: pd.DataFrame, constraints: dict, reward_values: dict):
+        if data is self.data:
+            # Compiled path: cached column statistics/codes, same results.
+            return self.get_rewards_batch([constraints], [reward_values])[:, 0]
+
         cumulative_rewards = np.zeros(len(data), dtype=float)
 
         for col in data.columns:
@@ -134,6 +163,107 @@ class GraphWorld():
 
         return cumulative_rewards
 
+
+    def _reward_column(self, col):
+        """
+        Cached per-column data for the reward compiler:
+          - "values": float array, nanmin, nanmax (None if not numeric)
+          - "codes": integer codes from pd.factorize (-1 = missing) and a
+            value -> code dictionary
+        """
+        cache = self._reward_columns
+        if col not in cache:
+            series = self.data[col]
+            entry = {}
+            try:
+                # float32 columns stay float32 so range checks round the
+                # constraint bounds exactly like the Series comparison does
+                dtype = np.float32 if series.dtype == np.float32 else float
+                values = np.asarray(series, dtype=dtype)
+            except (TypeError, ValueError):
+                values = None
+            if values is not None and values.size:
+                entry["values"] = (values, np.nanmin(values), np.nanmax(values))
+            else:
+                entry["values"] = None
+            codes, uniques = pd.factorize(series)
+            entry["codes"] = (codes, {value: code for code, value in enumerate(uniques)})
+            cache[col] = entry
+        return cache[col]
+
+
+    def get_rewards_batch(self, constraints_list, reward_values_list):
+        """
+        Evaluate many constraint/reward dicts against ``self.data`` at once.
+
+        Returns an ``(n_leaves, k)`` matrix whose column ``i`` equals
+        ``get_rewards`` for ``constraints_list[i]`` / ``reward_values_list[i]``
+        (same rules and errors as ``rewards_num_calc``/``rewards_cat_calc``).
+        Per-column min/max and categorical codes are computed once and cached
+        on the GraphWorld; each column is then evaluated for all constraint
+        sets that use it with one broadcast comparison.
+        """
+        if len(constraints_list) != len(reward_values_list):
+            raise ValueError("constraints_list and reward_values_list must have the same length!")
+
+        data = self.data
+        k = len(constraints_list)
+        rewards = np.zeros((len(data), k), dtype=float)
+        if len(data) == 0:
+            return rewards
+
+        for col in data.columns:
+            numeric_sets, lows, highs, num_rewards = [], [], [], []
+            cat_sets, cat_codes, cat_rewards = [], [], []
+
+            for i, constraints in enumerate(constraints_list):
+                if col not in constraints:
+                    continue
+                constraint = constraints[col]
+                reward = reward_values_list[i].get(col, (0, 1))  # Default to (0, 1) if no reward range is specified
+
+                if isinstance(constraint, str):  # Categorical constraint
+                    codes, lookup = self._reward_column(col)["codes"]
+                    cat_sets.append(i)
+                    cat_codes.append(lookup.get(constraint, -2))  # -2 never matches
+                    cat_rewards.append((reward[0], reward[1]))
+                elif isinstance(constraint, tuple) and len(constraint) == 2:  # Numeric constraint
+                    cached = self._reward_column(col)["values"]
+                    if cached is None:
+                        # Not float-convertible: keep the reference behaviour
+                        rewards[:, i] += self.rewards_num_calc(data[col], constraints=constraint, rewards=reward)
+                        continue
+                    _, min_val, max_val = cached
+                    low, high = constraint
+                    if low is None or low == -np.inf or (isinstance(low, float) and np.isnan(low)):
+                        low = min_val
+                    if high is None or high == np.inf or (isinstance(high, float) and np.isnan(high)):
+                        high = max_val
+                    if low > high:
+                        raise ValueError(f"Invalid range: low ({low}) is greater than high ({high}).")
+                    numeric_sets.append(i)
+                    lows.append(low)
+                    highs.append(high)
+                    num_rewards.append((reward[0], reward[1]))
+                else:
+                    raise ValueError(f"Invalid constraint for column {col}: {constraint}")
+
+            if numeric_sets:
+                values = self._reward_column(col)["values"][0][:, None]
+                lows = np.asarray(lows, dtype=values.dtype)
+                highs = np.asarray(highs, dtype=values.dtype)
+                mask = (values >= lows) & (values <= highs)  # NaN -> False
+                r = np.asarray(num_rewards, dtype=float)
+                rewards[:, numeric_sets] += mask * r[:, 1] + (1 - mask) * r[:, 0]
+
+            if cat_sets:
+                codes = self._reward_column(col)["codes"][0][:, None]
+                mask = codes == np.asarray(cat_codes)
+                r = np.asarray(cat_rewards, dtype=float)
+                rewards[:, cat_sets] += mask * r[:, 1] + (~mask) * r[:, 0]
+
+        return rewards
+
     def set_utility_values(self , utility_values):
         if len(utility_values) != self.num_states:
             raise ValueError(f"The length of the utility_values array and states array are not the same!")
@@ -148,13 +278,230 @@ class GraphWorld():
             item.reward = states_rewards[item.key]
 
 
+    def _subtree_structure(self):
+        """
+        Edge arrays (parent, child) of the graph and the states without a
+        parent. Cached; depends only on the transition model.
+        """
+        cached = self._structure
+        if cached is None:
+            counts = [len(state.children) for state in self.states]
+            parents = np.repeat(np.arange(self.num_states), counts)
+            children = np.asarray(
+                [child for state in self.states for child in state.children], dtype=np.int64
+            )
+            has_parent = np.zeros(self.num_states, dtype=bool)
+            has_parent[children] = True
+            cached = self._structure = (parents, children, np.flatnonzero(~has_parent))
+        return cached
+
+
+    def _leaf_map(self, column):
+        """
+        ``(rows, first_leaf)`` for ``leaf_rows``: the row position of every
+        leaf state (-1 elsewhere) and the smallest row position below every
+        state. None when the leaves cannot be matched to rows one to one.
+        """
+        if column not in self._leaf_maps:
+            found = None
+            labels = pd.Index(self.probability_matrix.index.astype(str))
+            if column in self.data.columns and labels.is_unique:
+                values = pd.Index(self.data[column].astype(str))
+                states = labels.get_indexer(values)
+                parents, children, roots = self._subtree_structure()
+
+                # Every row needs its own childless state, reachable from a root
+                reachable = np.zeros(self.num_states, dtype=bool)
+                reachable[roots] = True
+                reachable, _ = self._propagate(reachable, None, children, parents)
+                if (
+                    values.is_unique
+                    and (states >= 0).all()
+                    and not any(self.states[s].children for s in states)
+                    and reachable[states].all()
+                ):
+                    rows = np.full(self.num_states, -1, dtype=np.int64)
+                    rows[states] = np.arange(len(states))
+                    first_leaf = np.full(self.num_states, np.iinfo(np.int64).max, dtype=np.int64)
+                    first_leaf[states] = rows[states]
+                    first_leaf, _ = self._propagate(first_leaf, None, parents, children, np.minimum)
+                    found = (rows, first_leaf)
+            self._leaf_maps[column] = found
+        return self._leaf_maps[column]
+
+
+    def leaf_rows(self, column):
+        """
+        Row position in ``self.data`` of every state (-1 for non-leaf states),
+        matching state labels against ``self.data[column]`` (the last level of
+        the architecture the transition model was generated from).
+
+        None when that does not give a one-to-one mapping: repeated or
+        missing labels, a leaf state with children, or one no root reaches.
+        Callers then cannot search the graph and should score every row.
+        """
+        found = self._leaf_map(column)
+        return None if found is None else found[0]
+
+
+    def _propagate(self, up, down, parents, children, up_op=np.maximum):
+        """
+        Fold child values into their parents (``up_op`` for ``up``, minimum for
+        ``down``) until nothing changes: one round per level, so a tree/DAG
+        takes depth + 1 rounds, and cycles also settle. Swapping ``parents``
+        and ``children`` pushes values down instead.
+        """
+        for _ in range(self.num_states):
+            new_up = up.copy()
+            up_op.at(new_up, parents, up[children])
+            new_down = None
+            if down is not None:
+                new_down = down.copy()
+                np.minimum.at(new_down, parents, down[children])
+            if np.array_equal(new_up, up) and (down is None or np.array_equal(new_down, down)):
+                break
+            up, down = new_up, new_down
+        return up, down
+
+
+    def subtree_bounds(self, values, column):
+        """
+        Max and min of the row ``values`` (one per row, in ``self.data``
+        order) over the leaves reachable from every state, plus whether any of
+        those leaves is NaN. Leaves are matched to rows by ``leaf_rows(column)``.
+        NaN leaves are ignored by max/min; a state without non-NaN leaves gets
+        max = -inf and min = +inf.
+
+        Works on raw column values, so the result depends on the data only
+        and can be cached per GraphWorld: any monotone normalization of the
+        column maps these to bounds of its normalized contributions.
+        """
+        values = np.asarray(values)
+        if values.shape != (len(self.data),):
+            raise ValueError(f"values must have shape ({len(self.data)},); got {values.shape}")
+        rows = self.leaf_rows(column)
+        if rows is None:
+            raise ValueError(f"The leaves of the graph do not map one to one onto the rows by {column!r}.")
+        if values.dtype.kind != "f":
+            values = values.astype(np.float64)
+
+        parents, children, _ = self._subtree_structure()
+        leaves = np.flatnonzero(rows >= 0)
+        missing = np.isnan(values[rows[leaves]])
+
+        subtree_max = np.full(self.num_states, -np.inf, dtype=values.dtype)
+        subtree_min = np.full(self.num_states, np.inf, dtype=values.dtype)
+        subtree_max[leaves] = np.where(missing, -np.inf, values[rows[leaves]])
+        subtree_min[leaves] = np.where(missing, np.inf, values[rows[leaves]])
+        subtree_max, subtree_min = self._propagate(subtree_max, subtree_min, parents, children)
+
+        has_nan = np.zeros(self.num_states, dtype=bool)
+        has_nan[leaves] = missing
+        has_nan, _ = self._propagate(has_nan, None, parents, children)
+        return subtree_max, subtree_min, has_nan
+
+
+    def top_k_leaves(self, k, node_bound, leaf_score, column):
+        """
+        Best-first branch-and-bound search for the ``k`` highest scoring leaves,
+        with leaves matched to rows by ``leaf_rows(column)``.
+
+        ``node_bound(states)`` returns, for an array of inner states, an upper
+        bound on the score of every leaf below each of them; ``leaf_score(states)``
+        returns the exact score of an array of leaf states. Both are only
+        called for the states the search reaches, and a subtree whose bound
+        cannot beat the current K-th best is never expanded.
+
+        Returns a list of ``(row_position, score)`` pairs, where
+        ``row_position`` indexes ``self.data``. The result equals a stable
+        descending sort of the exhaustive scores (ties keep data order).
+        Raises ValueError when the leaves do not map onto the rows.
+        """
+        if k <= 0:
+            return []
+
+        found = self._leaf_map(column)
+        if found is None:
+            raise ValueError(f"The leaves of the graph do not map one to one onto the rows by {column!r}.")
+        rows, first_leaf = found
+        _, _, roots = self._subtree_structure()
+
+        heap = []
+
+        def push(states):
+            states = np.asarray(states, dtype=np.int64)
+            is_leaf = rows[states] >= 0
+            leaves, inner = states[is_leaf], states[~is_leaf]
+            if len(leaves):
+                for node, score in zip(leaves, leaf_score(leaves)):
+                    heapq.heappush(heap, (-float(score), int(first_leaf[node]), int(node)))
+            if len(inner):
+                for node, upper in zip(inner, node_bound(inner)):
+                    # Small slack so rounding in the bound never undercuts a leaf
+                    upper = float(upper) + 1e-9 * (abs(float(upper)) + 1.0)
+                    heapq.heappush(heap, (-upper, int(first_leaf[node]), int(node)))
+
+        push(roots)
+        results = []
+        seen = set()
+        while heap and len(results) < k:
+            neg_bound, _, node = heapq.heappop(heap)
+            if node in seen:
+                continue
+            seen.add(node)
+
+            if rows[node] >= 0:
+                # A leaf's bound is its exact score; nothing left on the heap
+                # can beat it, so it is the next result.
+                results.append((int(rows[node]), -neg_bound))
+                continue
+
+            push([child for child in self.states[node].children if child not in seen])
+
+        return results
+
+
+    def graph_view(self):
+        """Compact copy of the solved graph (see ``GraphView``) for views and drill-down."""
+        parents, children, _ = self._subtree_structure()
+        indptr = np.zeros(self.num_states + 1, dtype=np.int64)
+        np.cumsum([len(state.children) for state in self.states], out=indptr[1:])
+        return GraphView(
+            labels=self.probability_matrix.index.astype(str).to_numpy(),
+            indptr=indptr,
+            children=children,
+            probabilities=np.asarray(self.transition_model[parents, children], dtype=float),
+            utility=np.array([state.utility_value for state in self.states], dtype=float),
+            reward=np.array([state.reward for state in self.states], dtype=float),
+        )
+
+
+    def export_subgraph(self, root=None, depth=2, top_n=5):
+        """Level-of-detail view of the MDP graph; see ``GraphView.export_subgraph``."""
+        return self.graph_view().export_subgraph(root=root, depth=depth, top_n=top_n)
+
+
+    def export_graph_json(self, path, root=None, depth=2, top_n=5):
+        """Write ``export_subgraph`` to ``path`` as JSON (compact, for the frontend)."""
+        self.graph_view().export_graph_json(path, root=root, depth=depth, top_n=top_n)
+
+
     def draw_MDP_graph(self, save_path=None):
         """
         Visualize the MDP as a left-to-right directed graph:
         - 0: root node
         - 1 to inner_node_num - 1: inner nodes
         - inner_node_num to num_states - 1: leaf nodes
+
+        Debugging aid for small graphs only; use ``export_subgraph`` for
+        anything larger. With ``save_path`` the figure is written to disk
+        instead of opening a window (works on headless servers).
         """
+        import networkx as nx
+        import matplotlib
+        if save_path:
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
 
         probability_matrix = self.probability_matrix
         G = nx.DiGraph()
@@ -199,7 +546,166 @@ class GraphWorld():
             arrowsize=20  # For directed edges
         )
         plt.title("Left-to-Right Custom Graph")
-        plt.show()
+        if save_path:
+            plt.savefig(save_path)
+            plt.close()
+        else:
+            plt.show()
+
+
+def _utility_color(utility, lo, hi):
+    """Hex colour from blue (lowest visible utility) to red (highest)."""
+    t = 0.5 if hi <= lo else (utility - lo) / (hi - lo)
+    red, blue = int(round(255 * t)), int(round(255 * (1 - t)))
+    return f"#{red:02x}40{blue:02x}"
+
+
+class GraphView():
+    """
+    What the frontend views need from a solved GraphWorld, in compact form:
+    state labels, the children of every state in CSR layout (``indptr`` /
+    ``children``) with their transition probabilities, and the utility and
+    reward of every state.
+
+    A ranking job saves the view of its own graph (``save``), so a later
+    drill-down loads it (``load``) and only expands the visible nodes,
+    without filtering, regenerating the transition model or solving again.
+    """
+
+    def __init__(self, labels, indptr, children, probabilities, utility, reward):
+        self.labels = np.asarray(labels)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.children = np.asarray(children, dtype=np.int64)
+        self.probabilities = np.asarray(probabilities, dtype=float)
+        self.utility = np.asarray(utility, dtype=float)
+        self.reward = np.asarray(reward, dtype=float)
+        self.num_states = len(self.labels)
+        if self.indptr.shape != (self.num_states + 1,) or len(self.children) != self.indptr[-1]:
+            raise ValueError("indptr/children do not describe the children of every state.")
+
+    def save(self, path):
+        """Write the view to ``path`` (``.npz``), atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                labels=self.labels.astype(str),
+                indptr=self.indptr,
+                children=self.children,
+                probabilities=self.probabilities,
+                utility=self.utility,
+                reward=self.reward,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(**{name: z[name] for name in z.files})
+
+    def _children(self, key):
+        lo, hi = self.indptr[key], self.indptr[key + 1]
+        return self.children[lo:hi], self.probabilities[lo:hi]
+
+    def export_subgraph(self, root=None, depth=2, top_n=5):
+        """
+        Level-of-detail view of the MDP graph for the frontend.
+
+        Starting at ``root`` (a state key; None = the states without a
+        parent), expands ``depth`` levels. Each expanded node keeps its
+        ``top_n`` children by transition probability. The remaining children
+        are folded into one ``collapsed`` entry with their count and total
+        probability. Nodes on the last level are not expanded and report
+        their ``child_count``, so the client can call this again with that
+        node as ``root`` to drill down.
+
+        Nodes carry their label, utility, reward and a utility colour scaled
+        over the visible nodes. Work and payload depend only on the visible
+        nodes, not on the size of the graph.
+        """
+        if depth < 0 or top_n <= 0:
+            raise ValueError("depth must be >= 0 and top_n positive.")
+        if root is not None and not 0 <= root < self.num_states:
+            raise ValueError(f"root must be a state key in [0, {self.num_states}); got {root}")
+
+        def top_children(node_keys, probs):
+            if len(node_keys) <= top_n:
+                keep = np.argsort(-probs, kind="stable")
+            else:
+                keep = np.argpartition(-probs, top_n - 1)[:top_n]
+                keep = keep[np.argsort(-probs[keep], kind="stable")]
+            rest = np.ones(len(node_keys), dtype=bool)
+            rest[keep] = False
+            return node_keys[keep], probs[keep], int(rest.sum()), float(probs[rest].sum())
+
+        nodes, edges, collapsed = {}, [], []
+
+        def add_node(key, level):
+            if key not in nodes:
+                child_count = int(self.indptr[key + 1] - self.indptr[key])
+                nodes[key] = {
+                    "id": int(key),
+                    "label": str(self.labels[key]),
+                    "leaf": child_count == 0,
+                    "utility": float(self.utility[key]),
+                    "reward": float(self.reward[key]),
+                    "child_count": child_count,
+                    "expanded": False,
+                    "level": level,
+                }
+
+        if root is None:
+            # Virtual root: the parentless states, ranked by utility.
+            has_parent = np.zeros(self.num_states, dtype=bool)
+            has_parent[self.children] = True
+            roots = np.flatnonzero(~has_parent)
+            frontier, _, rest_count, _ = top_children(roots, self.utility[roots])
+            if rest_count:
+                collapsed.append({"id": "root:rest", "parent": None, "count": rest_count, "probability": None})
+        else:
+            frontier = np.array([root])
+
+        frontier = [int(k) for k in frontier]
+        for key in frontier:
+            add_node(key, 0)
+
+        for level in range(depth):
+            next_frontier = []
+            for key in frontier:
+                children, probs = self._children(key)
+                if not len(children) or nodes[key]["expanded"]:
+                    continue
+                nodes[key]["expanded"] = True
+                kept, kept_probs, rest_count, rest_mass = top_children(children, probs)
+                for child, prob in zip(kept, kept_probs):
+                    child = int(child)
+                    is_new = child not in nodes
+                    add_node(child, level + 1)
+                    edges.append({"source": key, "target": child, "probability": float(prob)})
+                    if is_new:
+                        next_frontier.append(child)
+                if rest_count:
+                    collapsed.append(
+                        {"id": f"{key}:rest", "parent": key, "count": rest_count, "probability": rest_mass}
+                    )
+            frontier = next_frontier
+
+        utilities = np.array([n["utility"] for n in nodes.values()], dtype=float)
+        lo, hi = (utilities.min(), utilities.max()) if len(utilities) else (0.0, 0.0)
+        for n in nodes.values():
+            n["color"] = _utility_color(n["utility"], lo, hi)
+
+        return {
+            "root": None if root is None else int(root),
+            "nodes": list(nodes.values()),
+            "edges": edges,
+            "collapsed": collapsed,
+        }
+
+    def export_graph_json(self, path, root=None, depth=2, top_n=5):
+        """Write ``export_subgraph`` to ``path`` as JSON (compact, for the frontend)."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.export_subgraph(root=root, depth=depth, top_n=top_n), f, separators=(",", ":"))
 
 
 class GraphState():
@@ -281,4 +787,42 @@ class GraphState():
 
         # If we reach here, either all relevant columns were equal or unusable.
         # Treat states as equal in ordering.
-        return False
\ No newline at end of file
+        return False
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Drill down into graphs saved with main.py --graph-save")
+    p.add_argument(
+        "--serve",
+        action="store_true",
+        help="Answer JSON lines {\"graph\": path, \"root\": key, \"depth\": n, \"top_n\": n} "
+             "from stdin with the export_subgraph view, one JSON line each",
+    )
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Saved views, least recently used first; reloaded when the job rewrote the file.
+    views = OrderedDict()
+    if args.serve:
+        for line in sys.stdin:
+            try:
+                msg = json.loads(line)
+                path = msg["graph"]
+                version = dataset_version(path)
+                hit = views.pop(path, None)
+                if hit is None or hit[0] != version:
+                    hit = (version, GraphView.load(path))
+                views[path] = hit
+                while len(views) > 16:
+                    views.popitem(last=False)
+                root = msg.get("root")
+                reply = hit[1].export_subgraph(
+                    root=None if root is None else int(root),
+                    depth=int(msg.get("depth", 2)),
+                    top_n=int(msg.get("top_n", 10)),
+                )
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                reply = {"error": str(e)}
+            print(json.dumps(reply, separators=(",", ":")), flush=True)
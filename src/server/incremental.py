@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+from utils import Utils, higher_is_better, normalize_numeric, range_bounds
+
+
+class DatasetColumns:
+    """
+    Column arrays of one dataset frame, built on first use and shared by
+    every ``IncrementalRanker`` over that frame (main.py keeps one per
+    dataset version), so sessions do not each hold a copy:
+
+    - ``numeric(col)``: ``pd.to_numeric`` values as a float array;
+    - ``matches(col, value)``: rows whose string form equals ``value``.
+      ``category`` columns are compared through their codes; other columns
+      keep one ``astype(str)`` array.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._numeric_values = {}  # col -> to_numeric values (float ndarray)
+        self._string_values = {}   # col -> astype(str) values (non-category columns)
+
+    def numeric(self, col):
+        if col not in self._numeric_values:
+            self._numeric_values[col] = pd.to_numeric(self.df[col], errors="coerce").to_numpy(dtype=float)
+        return self._numeric_values[col]
+
+    def matches(self, col, value):
+        s = self.df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return Utils._str_isin(s, {str(value)}).to_numpy()
+        if col not in self._string_values:
+            self._string_values[col] = s.astype(str).to_numpy()
+        return self._string_values[col] == str(value)
+
+
+class IncrementalRanker:
+    """
+    Session-scoped ranker that re-ranks after small constraint/weight edits.
+
+    Produces the same filter and scores as ``Utils.filter_dataFrame`` +
+    ``compute_weighted_utility``, but keeps the state of the previous call:
+
+    - one mask per hard constraint plus their conjunction. Tightening a
+      numeric range only re-tests the rows that passed the old range, and
+      the overall mask just shrinks;
+    - the normalized contribution of every weighted column together with
+      the min/max (or chosen category) it was computed from. A column is
+      only renormalized when those change;
+    - the score vector, which is patched with rank-1 deltas
+      ``(w_new * c_new - w_old * c_old)`` for the columns that changed.
+
+    The score vector is recomputed from scratch every ``rebuild_every``
+    updates so rounding from the deltas cannot accumulate. Deltas can still
+    differ from a fresh sum in the last bits, so ``update`` returns scores
+    summed afresh over the passing rows unless ``exact=False``. Whether a
+    range is compared numerically is decided once over the whole dataset
+    rather than on the rows left by earlier constraints.
+
+    The raw column arrays live in ``columns`` (a ``DatasetColumns`` that can
+    be shared between rankers on the same frame); a ranker itself only
+    keeps masks, contributions and scores.
+    """
+
+    def __init__(self, df: pd.DataFrame, rebuild_every: int = 50, columns: DatasetColumns = None):
+        self.df = df
+        self.rebuild_every = int(rebuild_every)
+        if columns is None:
+            columns = DatasetColumns(df)
+        elif columns.df is not df:
+            raise ValueError("columns must be built over the same frame as the ranker.")
+        self.columns = columns
+
+        n = len(df)
+        self.mask = np.ones(n, dtype=bool)
+        self.scores = np.zeros(n, dtype=float)
+
+        self._col_masks = {}     # col -> (cond, mask ndarray)
+        self._contribs = {}      # raw_col -> (key, contrib ndarray)
+        self._weights = {}       # raw_col -> weight used in self.scores
+        self._updates = 0
+
+        # What the last update() had to redo; handy for logging/metrics.
+        self.last_update = {}
+
+    def _resolve(self, raw_col):
+        return raw_col if raw_col in self.df.columns else Utils._resolve_col(self.df, raw_col)
+
+    def _update_masks(self, constraints_map):
+        """Refresh per-constraint masks; returns (changed, only_shrunk)."""
+        wanted = {}
+        for raw_col, cond in (constraints_map or {}).items():
+            col = self._resolve(raw_col)
+            if col:
+                wanted[col] = cond
+
+        changed, only_shrunk = [], True
+        for col in list(self._col_masks):
+            if col not in wanted:
+                del self._col_masks[col]
+                changed.append(col)
+                only_shrunk = False
+
+        for col, cond in wanted.items():
+            old = self._col_masks.get(col)
+            if old is not None and old[0] == cond:
+                continue
+
+            s = self.df[col]
+            numericish = bool(np.any(~np.isnan(self.columns.numeric(col))))
+            tighter = (
+                old is not None
+                and numericish
+                and isinstance(cond, (list, tuple)) and len(cond) == 2
+                and isinstance(old[0], (list, tuple)) and len(old[0]) == 2
+            )
+            if tighter:
+                old_low, old_high = range_bounds(old[0])
+                new_low, new_high = range_bounds(cond)
+                tighter = new_low >= old_low and new_high <= old_high
+
+            if tighter:
+                # Only rows that passed the old range can pass the new one.
+                mask = old[1].copy()
+                rows = np.flatnonzero(mask)
+                sub = Utils.constraint_mask(s.iloc[rows], cond, numericish=numericish)
+                mask[rows] = sub.to_numpy(dtype=bool)
+            else:
+                sub = Utils.constraint_mask(s, cond, numericish=numericish)
+                mask = np.ones(len(s), dtype=bool) if sub is None else sub.to_numpy(dtype=bool)
+                only_shrunk = False
+
+            self._col_masks[col] = (cond, mask)
+            changed.append(col)
+
+        if changed:
+            if only_shrunk:
+                for col in changed:
+                    self.mask &= self._col_masks[col][1]
+            else:
+                self.mask = np.ones(len(self.df), dtype=bool)
+                for _, mask in self._col_masks.values():
+                    self.mask &= mask
+        return changed, only_shrunk
+
+    def _contribution(self, raw_col, constraints_map):
+        """(key, contrib) for one weighted column, reusing the cached one when its key is unchanged."""
+        col = self._resolve(raw_col)
+        if not col:
+            return None
+
+        values = self.columns.numeric(col)[self.mask]
+        if np.any(~np.isnan(values)):
+            key = ("numeric", np.nanmin(values), np.nanmax(values))
+        else:
+            key = ("categorical", constraints_map.get(col, None))
+
+        cached = self._contribs.get(raw_col)
+        if cached is not None and cached[0] == key:
+            return cached
+
+        if key[0] == "numeric":
+            contrib = normalize_numeric(
+                self.df[col], higher_is_better=higher_is_better(col), bounds=key[1:]
+            ).to_numpy(dtype=float)
+        elif key[1] is None:
+            contrib = np.ones(len(self.df))  # neutral
+        else:
+            contrib = self.columns.matches(col, key[1]).astype(float)
+        return key, np.nan_to_num(contrib, nan=0.0)
+
+    def update(self, constraints_map: dict, weights: dict, exact: bool = True) -> pd.Series:
+        """
+        Apply the current constraints and weights; returns the utility of
+        every row that passes the hard constraints (indexed like ``df``).
+
+        With ``exact`` the returned scores are summed afresh from the cached
+        contributions over the passing rows, in ``compute_weighted_utility``
+        order, so they are bit-for-bit equal to it. Without it they are read
+        from the delta-patched score vector (same order up to last-bit ties).
+        """
+        changed_masks, only_shrunk = self._update_masks(constraints_map)
+
+        new_contribs = {}
+        for raw_col in weights:
+            found = self._contribution(raw_col, constraints_map)
+            if found is not None:
+                new_contribs[raw_col] = found
+        new_weights = {raw_col: weights[raw_col] for raw_col in new_contribs}
+
+        self._updates += 1
+        renormalized = [
+            raw_col for raw_col, (key, _) in new_contribs.items()
+            if raw_col not in self._contribs or self._contribs[raw_col][0] != key
+        ]
+        rebuild = (
+            self._updates % self.rebuild_every == 0
+            or list(new_contribs) != list(self._contribs)
+        )
+
+        if rebuild:
+            # Same accumulation order as compute_weighted_utility.
+            self.scores = np.zeros(len(self.df), dtype=float)
+            for raw_col, (_, contrib) in new_contribs.items():
+                self.scores = self.scores + new_weights[raw_col] * contrib
+        else:
+            for raw_col, (key, contrib) in new_contribs.items():
+                old_key, old_contrib = self._contribs[raw_col]
+                old_w, new_w = self._weights[raw_col], new_weights[raw_col]
+                if old_key != key:
+                    self.scores += new_w * contrib - old_w * old_contrib
+                elif old_w != new_w:
+                    self.scores += (new_w - old_w) * contrib
+
+        self._contribs = new_contribs
+        self._weights = new_weights
+        self.last_update = {
+            "masks_changed": changed_masks,
+            "mask_only_shrunk": bool(changed_masks) and only_shrunk,
+            "renormalized": renormalized,
+            "rebuilt": rebuild,
+        }
+
+        rows = np.flatnonzero(self.mask)
+        if exact and not rebuild:
+            scores = np.zeros(len(rows), dtype=float)
+            for raw_col, (_, contrib) in new_contribs.items():
+                scores = scores + new_weights[raw_col] * contrib[rows]
+        else:
+            scores = self.scores[rows]
+        return pd.Series(scores, index=self.df.index[rows])
+
+    def ranked(self, topk: int = 0) -> pd.DataFrame:
+        """Rows passing the current constraints with ``utility_value``, best first."""
+        rows = np.flatnonzero(self.mask)
+        order = np.argsort(-self.scores[rows], kind="stable")
+        if topk and topk > 0:
+            order = order[:topk]
+        ranked = self.df.iloc[rows[order]].reset_index(drop=True)
+        ranked["utility_value"] = self.scores[rows[order]]
+        return ranked
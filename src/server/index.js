@@ -132,6 +132,80 @@ function parseCsvToRows(csvPath) {
 
 
 
+/* ------------------------------ Ranked results ------------------------------ */
+
+// Binary layout written by server/result_store.py (little-endian):
+//   "OXRS" | u32 version | u64 rowCount | u32 metaLen | u32 dataOffset | meta JSON
+//   | int64 positions[rowCount] (dataset rows, best first) | float64 scores[rowCount]
+function readRankedResultHeader(resultPath) {
+  const fd = fs.openSync(resultPath, 'r');
+  try {
+    const head = Buffer.alloc(24);
+    fs.readSync(fd, head, 0, head.length, 0);
+    if (head.toString('latin1', 0, 4) !== 'OXRS') {
+      throw new Error(`Not a ranked result file: ${resultPath}`);
+    }
+    const rowCount = Number(head.readBigUInt64LE(8));
+    const metaLen = head.readUInt32LE(16);
+    const dataOffset = head.readUInt32LE(20);
+    const metaBuf = Buffer.alloc(metaLen);
+    fs.readSync(fd, metaBuf, 0, metaLen, head.length);
+    return { rowCount, dataOffset, meta: JSON.parse(metaBuf.toString('utf8')) };
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
+// Read one page (offset/limit) of positions + scores; cost scales with the page size.
+function readRankedResultPage(resultPath, header, offset, limit) {
+  const start = Math.min(Math.max(0, offset), header.rowCount);
+  const count = Math.min(Math.max(0, limit), header.rowCount - start);
+  const posBuf = Buffer.alloc(count * 8);
+  const scoreBuf = Buffer.alloc(count * 8);
+
+  const fd = fs.openSync(resultPath, 'r');
+  try {
+    fs.readSync(fd, posBuf, 0, posBuf.length, header.dataOffset + 8 * start);
+    fs.readSync(fd, scoreBuf, 0, scoreBuf.length, header.dataOffset + 8 * (header.rowCount + start));
+  } finally {
+    fs.closeSync(fd);
+  }
+
+  const entries = [];
+  for (let i = 0; i < count; i += 1) {
+    entries.push({
+      position: Number(posBuf.readBigInt64LE(8 * i)),
+      score: scoreBuf.readDoubleLE(8 * i),
+    });
+  }
+  return entries;
+}
+
+// Same tag as dataset_version() in server/dataset.py: "<size>-<mtime in ns>"
+function datasetVersion(datasetPath) {
+  const st = fs.statSync(datasetPath, { bigint: true });
+  return `${st.size}-${st.mtimeNs}`;
+}
+
+// A ranked result only indexes rows of the dataset version it was computed on
+// (RankedResult.is_current in result_store.py).
+function isResultCurrent(header) {
+  const datasetPath = header.meta.dataset;
+  return fs.existsSync(datasetPath) && datasetVersion(datasetPath) === header.meta.dataset_version;
+}
+
+// Dataset rows, parsed once per dataset file (results only store row positions)
+let cachedDataset = null;
+async function getDatasetRows(datasetPath) {
+  const version = datasetVersion(datasetPath);
+  if (cachedDataset && cachedDataset.path === datasetPath && cachedDataset.version === version) {
+    return cachedDataset.rows;
+  }
+  const rows = await parseCsvToRows(datasetPath);
+  cachedDataset = { path: datasetPath, version, rows };
+  return rows;
+}
+
 /* ------------------------------ Directories ------------------------------ */
 
 const DIRS = {
@@ -192,6 +266,7 @@ function getLatestPage2JsonForUser(userKey) {
         f.startsWith(`${userKey}_`) &&
         f.endsWith('.json') &&
         !f.endsWith('_status.json') &&
+        !f.endsWith('.graph.json') && // graph views (/page2/graph)
         !f.includes('ranked_list') // exclude ranked_list*.json
     )
     .sort()
@@ -450,18 +525,60 @@ function toConstraintEntry({ selectedParameter, selectedSign, value }) {
 }
 
 /**
- * Spawn Python to produce BOTH CSV (timestamped) and JSON snapshot.
+ * Long-lived Python ranking scheduler (scheduler.py). Jobs are sent as JSON
+ * lines on its stdin; it coalesces them per user (only the latest runs),
+ * bounds concurrency with a warm process pool, and reports progress through
+ * the same <userKey>_status.json files (plus queue_depth / wait_ms metrics).
  */
+const RANKING_WORKERS = parseInt(process.env.RANKING_WORKERS || '2', 10);
+let rankingScheduler = null;
+
+function getRankingScheduler() {
+  if (rankingScheduler) return rankingScheduler;
+
+  const args = [
+    path.join(__dirname, 'scheduler.py'),
+    '--status-dir',
+    DIRS.page2,
+    '--workers',
+    String(RANKING_WORKERS),
+  ];
+  console.log('[scheduler] Starting python scheduler:', args);
+  const py = spawn(resolvePythonExe(), args, { cwd: __dirname });
+
+  py.stdout.on('data', (d) => process.stdout.write(d));
+  py.stderr.on('data', (d) => process.stderr.write(d));
+  py.on('error', (e) => {
+    console.error('[scheduler] spawn error:', e);
+    if (rankingScheduler === py) rankingScheduler = null;
+  });
+  // A write after the process died (EPIPE) is reported to the job's write
+  // callback; without a listener it would also crash the server.
+  py.stdin.on('error', (e) => {
+    console.error('[scheduler] stdin error:', e);
+    if (rankingScheduler === py) rankingScheduler = null;
+  });
+  py.on('close', (code) => {
+    console.warn('[scheduler] exited with code', code);
+    // Respawned on the next job.
+    if (rankingScheduler === py) rankingScheduler = null;
+  });
+
+  rankingScheduler = py;
+  return py;
+}
+
 /**
- * Spawn Python to produce the ranked CSV.
- * We no longer rely on JSON results.
+ * Queue a ranking for this user (binary result: dataset row positions + scores).
+ * Resolves once the job is handed to the scheduler; completion is reported via
+ * the status file. CSV is exported on demand (/page2/results.csv).
  */
 function runRankingForUser(userKey) {
   return new Promise((resolve, reject) => {
     try {
       const constraintsJson = getLatestPage2JsonForUser(userKey);
-       console.log('[runRankingForUser] userKey =', userKey, 'constraintsJson =', constraintsJson);
-	if (!constraintsJson) {
+      console.log('[runRankingForUser] userKey =', userKey, 'constraintsJson =', constraintsJson);
+      if (!constraintsJson) {
         return reject(new Error('No constraints saved for this user'));
       }
 
@@ -471,11 +588,8 @@ function runRankingForUser(userKey) {
 
       const datasetCsv = resolveDatasetPath();
       const probCsv = path.join(DIRS.dataArtifacts, 'graph_world.csv');
-      const mainPy = path.join(__dirname, 'main.py');
-      const pythonExe = resolvePythonExe();
 
       console.log('[runRankingForUser] datasetCsv =', datasetCsv);
-      console.log('[runRankingForUser] mainPy =', mainPy, 'pythonExe =', pythonExe);
       console.log('[runRankingForUser] probCsv exists =', fs.existsSync(probCsv));
 
       if (!datasetCsv) {
@@ -486,90 +600,49 @@ function runRankingForUser(userKey) {
       }
 
       const stamp = new Date().toISOString().replace(/[:.]/g, '-');
+      const outputResultTs = path.join(DIRS.page2, `${userKey}_ranked_list_${stamp}.bin`);
+      const outputResultLatest = path.join(DIRS.page2, `${userKey}_ranked_list.bin`);
 
-      // 🔹 THIS is the variable that was "not defined" before
-      const outputCsvTs = path.join(DIRS.page2, `${userKey}_ranked_list_${stamp}.csv`);
-      const outputCsvLatest = path.join(DIRS.page2, `${userKey}_ranked_list.csv`);
-
-      console.log('[runRankingForUser] outputCsvTs =', outputCsvTs);
-
-      writeStatus(userKey, {
-        state: 'running',
-        dataset: datasetCsv,
-        main: mainPy,
-        python: pythonExe,
-        csv: outputCsvTs,
-      });
+      console.log('[runRankingForUser] outputResultTs =', outputResultTs);
 
       // We still pass --json-output because main.py requires it as an argument,
       // but we won't use the JSON file anymore.
       const dummyJson = path.join(DIRS.page2, `${userKey}_ranked_list_unused.json`);
 
       const args = [
-        mainPy,
         '--constraints-json',
         constraintsJson,
         '--dataset',
         datasetCsv,
-        '--output',
-        outputCsvTs,
+        '--result-store',
+        outputResultTs,
         '--json-output',
         dummyJson,
       ];
       if (fs.existsSync(probCsv)) {
-        args.push('--probability', probCsv);
+        // graph_world.csv switches the graph step on. Each user gets their own
+        // transition artifact, so jobs in parallel workers never overwrite
+        // each other's graph. The top of the graph is exported with every
+        // ranking and the solved graph is saved for drill-downs (/page2/graph).
+        args.push(
+          '--probability', graphArtifactPath(userKey),
+          '--graph-export', graphViewPath(userKey),
+          '--graph-save', savedGraphPath(userKey)
+        );
       }
 
-      console.log('[runRankingForUser] Spawning python with args:', [pythonExe, ...args]);	    
-      const py = spawn(pythonExe, args, { cwd: __dirname });
-      
-
-      let stderr = '';
-      py.stderr.on('data', (d) => (stderr += d.toString()));
-      py.on('error', (e) => {
-	console.error('[runRankingForUser] spawn error:', e);
-        writeStatus(userKey, { state: 'error', error: String(e) });
-        reject(e);
-      });
-
-      py.on('close', (code) => {
-	console.log('[runRankingForUser] python exited with code', code);
-        if (code !== 0) {
-          writeStatus(userKey, { state: 'error', error: stderr || `python exited ${code}` });
-          return reject(new Error(stderr || `python exited ${code}`));
-        }
-
-        try {
-          // Copy timestamped CSV → stable "latest" CSV
-          try {
-            fs.copyFileSync(outputCsvTs, outputCsvLatest);
-            console.log('[runRankingForUser] Copied CSV to', outputCsvLatest);
-          } catch (e) {
-            console.warn('[runRankingForUser] Could not update latest CSV:', String(e));
-          }
+      // Shown right away; the scheduler overwrites it (queued → running → done).
+      writeStatus(userKey, { state: 'queued', dataset: datasetCsv });
 
-          // Count rows in CSV (ignoring header)
-          const csvText = fs.readFileSync(outputCsvTs, 'utf8').trim();
-          const csvLines = csvText ? csvText.split(/\r?\n/) : [];
-          const rowCount = Math.max(0, csvLines.length - 1);
-
-          console.log('[runRankingForUser] rowCount =', rowCount);
-
-          writeStatus(userKey, {
-            state: 'done',
-            rows: rowCount,
-            csv: path.basename(outputCsvTs),
-          });
-
-          resolve({
-            csvPath: outputCsvTs,
-            rows: rowCount,
-          });
-        } catch (e) {
-          console.error('[runRankingForUser] post-processing error:', e);
+      const job = { user: userKey, args, result: outputResultTs, latest: outputResultLatest };
+      console.log('[runRankingForUser] Queueing job:', job);
+      getRankingScheduler().stdin.write(JSON.stringify(job) + '\n', (e) => {
+        if (e) {
+          console.error('[runRankingForUser] could not queue job:', e);
           writeStatus(userKey, { state: 'error', error: String(e) });
-          reject(e);
+          return reject(e);
         }
+        resolve({ resultPath: outputResultTs });
       });
     } catch (e) {
       console.error('[runRankingForUser] outer error:', e);
@@ -619,12 +692,12 @@ async function handlePage2Constraints(req, res) {
     writeJsonPretty(filePath, payload);
 
     runRankingForUser(userKey)
-      .then(({ rows }) => console.log(`[page2] ranking complete for ${userKey}, rows=${rows}`))
+      .then(() => console.log(`[page2] ranking queued for ${userKey}`))
       .catch((e) => console.error('[page2] ranking error', e));
 
     return res
       .status(200)
-      .json({ ok: true, saved: filename, message: 'Constraints saved. Ranking started.' });
+      .json({ ok: true, saved: filename, message: 'Constraints saved. Ranking queued.' });
   } catch (err) {
     return res
       .status(500)
@@ -636,8 +709,110 @@ async function handlePage2Constraints(req, res) {
 app.post('/page2', handlePage2Constraints);
 app.post('/page2/constraints', handlePage2Constraints);
 
-// Results endpoint: serve latest CSV snapshot
-// Results endpoint: serve rows parsed from the latest CSV (no JSON file)
+/* ------------------------------ Facet counts ------------------------------ */
+
+// Long-lived python process that answers one JSON line per request line, in
+// order (facets.py --serve, graph_world.py --serve). `onStop` runs when it
+// dies; pending requests are rejected and the caller starts a new one.
+function startLineServer(label, args, onStop) {
+  const py = spawn(resolvePythonExe(), args, { cwd: __dirname });
+  const server = { py, pending: [], buffer: '' };
+
+  py.stdout.on('data', (d) => {
+    server.buffer += d.toString();
+    let nl;
+    while ((nl = server.buffer.indexOf('\n')) >= 0) {
+      const line = server.buffer.slice(0, nl);
+      server.buffer = server.buffer.slice(nl + 1);
+      const waiter = server.pending.shift();
+      if (!waiter) continue;
+      try {
+        waiter.resolve(JSON.parse(line));
+      } catch (e) {
+        waiter.reject(e);
+      }
+    }
+  });
+  py.stderr.on('data', (d) => process.stderr.write(d));
+  const fail = (e) => {
+    console.error(`[${label}] server stopped:`, e);
+    onStop(server);
+    server.pending.splice(0).forEach((w) => w.reject(e instanceof Error ? e : new Error(String(e))));
+  };
+  py.on('error', fail);
+  py.stdin.on('error', fail);
+  py.on('close', (code) => fail(`${label} exited ${code}`));
+  return server;
+}
+
+function requestLine(server, message) {
+  return new Promise((resolve, reject) => {
+    server.pending.push({ resolve, reject });
+    server.py.stdin.write(JSON.stringify(message) + '\n');
+  });
+}
+
+// `facets.py --serve`: loads (or builds once per dataset version) the
+// precomputed facet cube, so the constraints page can show live
+// "N models match" counts.
+let facetServer = null;
+
+function getFacetServer(datasetPath) {
+  const st = fs.statSync(datasetPath);
+  const version = `${st.size}-${st.mtimeMs}`;
+  if (facetServer && facetServer.path === datasetPath && facetServer.version === version) {
+    return facetServer;
+  }
+  if (facetServer) facetServer.py.kill();
+
+  const server = startLineServer('facets', [path.join(__dirname, 'facets.py'), datasetPath, '--serve'], (stopped) => {
+    if (facetServer === stopped) facetServer = null;
+  });
+  server.path = datasetPath;
+  server.version = version;
+  facetServer = server;
+  return server;
+}
+
+function queryFacets(datasetPath, constraints_map) {
+  return requestLine(getFacetServer(datasetPath), { constraints_map });
+}
+
+// POST /page2/facets  { constraints: [{ selectedParameter, selectedSign, value }, ...] }
+// → { ok, rows, exact, total, facets: {col: {value: rows}}, ranges: {metric: {min, max, p10, p50, p90}} }
+app.post('/page2/facets', async (req, res) => {
+  try {
+    const datasetCsv = resolveDatasetPath();
+    if (!datasetCsv) {
+      return res.status(500).json({ error: 'Dataset not found' });
+    }
+
+    const { constraints = [] } = req.body || {};
+    const constraints_map = {};
+    constraints
+      .filter((c) => c && c.selectedParameter)
+      .forEach((row) => {
+        const { key, constraint } = toConstraintEntry(row);
+        if (!key || constraint === null || constraint === undefined || constraint === '') return;
+        constraints_map[key] = constraint;
+      });
+
+    const reply = await queryFacets(datasetCsv, constraints_map);
+    if (reply.error) {
+      return res.status(400).json({ error: reply.error });
+    }
+    res.json({ ok: true, ...reply });
+  } catch (e) {
+    console.error('[POST /page2/facets] error:', e);
+    res.status(500).json({ error: 'Failed to compute facet counts' });
+  }
+});
+
+// Results endpoint: serve one page (?offset=&limit=, default: the first
+// RESULTS_PAGE_SIZE rows) of the latest ranked result, joined with the cached
+// dataset rows. Only that page is read, whatever the size of the result.
+const RESULTS_PAGE_SIZE = 100;
+const RESULTS_MAX_PAGE_SIZE = 1000;
 
 app.get('/page2/results', async (req, res) => {
   try {
@@ -645,36 +820,49 @@ app.get('/page2/results', async (req, res) => {
     const status = readStatus(userKey);
     console.log('[GET /page2/results] userKey =', userKey, 'status =', status);
 
-    if (!status || (!status.csv && status.state !== 'done')) {
-      if (status && (status.state === 'running' || status.state === 'queued')) {
-        return res.status(202).json({ state: status.state });
-      }
-      return res
-        .status(404)
-        .json({ error: 'No results yet', state: status ? status.state : 'idle' });
-    }
-
     if (status.state === 'running' || status.state === 'queued') {
       return res.status(202).json({ state: status.state });
     }
 
-    const csvFileName = status.csv;
-    if (!csvFileName) {
-      return res.status(404).json({ error: 'No CSV found', state: status.state });
+    if (!status.result || status.state !== 'done') {
+      return res
+        .status(404)
+        .json({ error: 'No results yet', state: status ? status.state : 'idle' });
     }
 
-    const csvPath = path.join(DIRS.page2, csvFileName);
-    if (!fs.existsSync(csvPath)) {
-      return res.status(404).json({ error: 'CSV file missing', state: status.state });
+    const resultPath = path.join(DIRS.page2, status.result);
+    if (!fs.existsSync(resultPath)) {
+      return res.status(404).json({ error: 'Result file missing', state: status.state });
     }
 
-    // NEW: use robust CSV parsing
-    const rows = await parseCsvToRows(csvPath);
+    const header = readRankedResultHeader(resultPath);
+    if (!isResultCurrent(header)) {
+      // Positions would point at the wrong rows: rank again on the new data.
+      runRankingForUser(userKey).catch((e) => console.error('[GET /page2/results] re-rank error', e));
+      return res
+        .status(409)
+        .json({ error: 'Dataset changed since this ranking; re-ranking', state: 'stale' });
+    }
+    const offset = Math.max(Number.parseInt(req.query.offset, 10) || 0, 0);
+    const requested = Number.parseInt(req.query.limit, 10);
+    const limit = Math.min(
+      Number.isNaN(requested) ? RESULTS_PAGE_SIZE : Math.max(requested, 0),
+      RESULTS_MAX_PAGE_SIZE
+    );
+
+    const datasetRows = await getDatasetRows(header.meta.dataset);
+    const rows = readRankedResultPage(resultPath, header, offset, limit).map(
+      ({ position, score }) => ({ ...datasetRows[position], utility_value: String(score) })
+    );
 
     return res.json({
       ok: true,
       state: status.state,
-      csv: csvFileName,
+      // The Results page only checks that this is set; downloads use /page2/results.csv
+      csv: status.result,
+      total: header.rowCount,
+      offset,
+      limit,
       rows,
     });
   } catch (e) {
@@ -683,7 +871,120 @@ app.get('/page2/results', async (req, res) => {
   }
 });
 
+// On-demand CSV export of the latest ranked result (for downloads)
+app.get('/page2/results.csv', (req, res) => {
+  try {
+    const userKey = getUserKey(req);
+    const status = readStatus(userKey);
+    if (!status.result || status.state !== 'done') {
+      return res.status(404).json({ error: 'No results yet', state: status.state });
+    }
+
+    const resultPath = path.join(DIRS.page2, status.result);
+    if (!fs.existsSync(resultPath)) {
+      return res.status(404).json({ error: 'Result file missing', state: status.state });
+    }
+    if (!isResultCurrent(readRankedResultHeader(resultPath))) {
+      return res.status(409).json({ error: 'Dataset changed since this ranking; re-run it', state: 'stale' });
+    }
 
+    const csvPath = resultPath.replace(/\.bin$/, '.csv');
+    if (fs.existsSync(csvPath)) {
+      return res.download(csvPath);
+    }
+
+    const py = spawn(
+      resolvePythonExe(),
+      [path.join(__dirname, 'result_store.py'), resultPath, '--output', csvPath],
+      { cwd: __dirname }
+    );
+    let stderr = '';
+    py.stderr.on('data', (d) => (stderr += d.toString()));
+
+    // A failed spawn emits 'error' and may still emit 'close': answer once.
+    let responded = false;
+    const respond = (fn) => {
+      if (responded) return;
+      responded = true;
+      fn();
+    };
+    py.on('error', (e) => respond(() => res.status(500).json({ error: String(e) })));
+    py.on('close', (code) => {
+      if (code !== 0) {
+        console.error('[GET /page2/results.csv] export failed:', stderr);
+        return respond(() => res.status(500).json({ error: 'Failed to export CSV' }));
+      }
+      return respond(() => res.download(csvPath));
+    });
+  } catch (e) {
+    console.error('[GET /page2/results.csv] Error:', e);
+    return res.status(500).json({ error: 'Failed to export CSV' });
+  }
+});
+
+
+
+// Level-of-detail view of the user's MDP graph. Without ?root= this is the
+// view written by the latest ranking; ?root=<state key>[&depth=&top_n=]
+// drills down from that node in the graph the same ranking saved, so only
+// the visible nodes are expanded (no re-filtering or MDP solve).
+function graphViewPath(userKey) {
+  return path.join(DIRS.page2, `${userKey}_latest.graph.json`);
+}
+function graphArtifactPath(userKey) {
+  return path.join(DIRS.dataArtifacts, `${userKey}_graph_world.csv`);
+}
+function savedGraphPath(userKey) {
+  return path.join(DIRS.dataArtifacts, `${userKey}_graph_world.npz`);
+}
+
+// `graph_world.py --serve`: keeps the recently used saved graphs loaded and
+// answers drill-downs one at a time.
+let graphServer = null;
+
+function getGraphServer() {
+  if (!graphServer) {
+    graphServer = startLineServer('graph', [path.join(__dirname, 'graph_world.py'), '--serve'], (stopped) => {
+      if (graphServer === stopped) graphServer = null;
+    });
+  }
+  return graphServer;
+}
+
+app.get('/page2/graph', async (req, res) => {
+  try {
+    const userKey = getUserKey(req);
+    if (req.query.root === undefined) {
+      const viewPath = graphViewPath(userKey);
+      if (!fs.existsSync(viewPath)) {
+        return res.status(404).json({ error: 'No graph view yet' });
+      }
+      return res.sendFile(viewPath);
+    }
+
+    const root = Number.parseInt(req.query.root, 10);
+    const depth = Number.parseInt(req.query.depth, 10) || 2;
+    const topN = Number.parseInt(req.query.top_n, 10) || 10;
+    if (!Number.isInteger(root) || root < 0) {
+      return res.status(400).json({ error: 'root must be a non-negative state key' });
+    }
+
+    const graphPath = savedGraphPath(userKey);
+    if (!fs.existsSync(graphPath)) {
+      return res.status(404).json({ error: 'No graph saved for this user yet' });
+    }
+    const reply = await requestLine(getGraphServer(), { graph: graphPath, root, depth, top_n: topN });
+    if (reply.error) {
+      const badRoot = /root must be a state key/.test(reply.error);
+      if (!badRoot) console.error('[GET /page2/graph] export failed:', reply.error);
+      return res.status(badRoot ? 400 : 500).json({ error: badRoot ? 'Unknown root' : 'Failed to export graph' });
+    }
+    return res.json(reply);
+  } catch (e) {
+    console.error('[GET /page2/graph] Error:', e);
+    return res.status(500).json({ error: 'Failed to export graph' });
+  }
+});
 
 app.get('/page2/status', (req, res) => {
   try {
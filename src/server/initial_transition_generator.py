@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 import pandas as pd 
 
@@ -7,6 +9,7 @@ def generate_initial_transition_model(
     selected_df: pd.DataFrame,
     modelArchitecture: list,
     file_name: str = "data/graph_world00.csv",
+    dtype=np.float64,
 ):
     """
     Build an initial transition model over the categorical levels given in
@@ -26,6 +29,10 @@ def generate_initial_transition_model(
     For any state i with no outgoing transitions (zero row), we set:
         P(i, i) = 1.0
     making it an absorbing state.
+
+    Each probability is computed in float64 and stored straight into a
+    matrix of ``dtype`` (also used for the CSV), e.g. ``np.float32`` to halve
+    the transition model; no float64 matrix is allocated.
     """
 
     # --- 1. enumerate states per level and assign global indices ---
@@ -33,7 +40,9 @@ def generate_initial_transition_model(
     state_pos_dic = {}       # maps state label -> global index
     pos = 0
     for item in modelArchitecture:
-        children = list(data[item].value_counts().index)
+        # (categorical columns also report unused categories with a zero count)
+        counts = data[item].value_counts()
+        children = list(counts[counts > 0].index)
         # deterministic ordering
         children.sort(key=str.lower)
         for child in children:
@@ -43,7 +52,7 @@ def generate_initial_transition_model(
         data_array.append(children)
 
     total_states = sum(len(x) for x in data_array)
-    initial_transitions = np.zeros((total_states, total_states), dtype=float)
+    initial_transitions = np.zeros((total_states, total_states), dtype=dtype)
 
     # Adaptive alpha based on relative dataset sizes
     if len(data) > 0:
@@ -61,12 +70,8 @@ def generate_initial_transition_model(
 
             # All children that appear with this parent in the full data
             mask_parent_all = data[parent_col] == parent
-            children_all = (
-                data[child_col][mask_parent_all]
-                .value_counts()
-                .keys()
-                .to_numpy()
-            )
+            child_counts_all = data[child_col][mask_parent_all].value_counts()
+            children_all = child_counts_all[child_counts_all > 0].keys().to_numpy()
 
             # Counts for (parent, child) within selected_df
             mask_parent_sel = selected_df[parent_col] == parent
@@ -108,7 +113,11 @@ def generate_initial_transition_model(
     idx_to_label = {v: k for k, v in state_pos_dic.items()}
     labels = [idx_to_label[i] for i in range(total_states)]
 
-    df = pd.DataFrame(initial_transitions, columns=labels, index=labels)
-    df.to_csv(file_name)
+    # Written to a temporary file and renamed, so a reader never sees a
+    # half-written model.
+    df = pd.DataFrame(initial_transitions, columns=labels, index=labels, copy=False)
+    tmp_name = f"{file_name}.tmp"
+    df.to_csv(tmp_name)
+    os.replace(tmp_name, file_name)
 
     return initial_transitions
@@ -6,38 +6,165 @@ import time
 import pandas as pd
 import numpy as np
 import csv
+from collections import OrderedDict
 
+from dataset import dataset_version, load_dataset
 from graph_world import GraphWorld
+from result_store import write_ranked_result
 from policy_iteration import PolicyIteration
 from initial_transition_generator import generate_initial_transition_model
-from utils import Utils, normalize_numeric  # filter, col resolution, numeric normalization
-
-
-# Columns where larger is better
-UP_BETTER = {
-    "accuracy", "precision", "recall", "f1_score",
-    "epochs", "RAM", "batch_size", "pool_size", "kernel_size",
-    "layers", "nodes"
-}
-# Columns where smaller is better
-DOWN_BETTER = {"loss", "training_time"}
-
-
-def parse_args():
+from utils import Utils, higher_is_better, normalize_numeric  # filter, col resolution, normalization
+from threshold import ThresholdIndex
+from incremental import DatasetColumns, IncrementalRanker
+
+
+# Per-process cache for structures that only depend on the dataset file.
+# A warm scheduler worker (scheduler.py) runs many jobs in one process and
+# reuses them; a one-off CLI run simply builds them once.
+_DATASET_CACHE = {}
+
+
+def cached_for_dataset(path: str, name: str, build):
+    """``build()`` once per dataset version; later calls with the same ``name`` reuse it."""
+    key = (os.path.abspath(path), name)
+    version = dataset_version(path)
+    hit = _DATASET_CACHE.get(key)
+    if hit is None or hit[0] != version:
+        hit = _DATASET_CACHE[key] = (version, build())
+    return hit[1]
+
+
+# Session -> IncrementalRanker, least recently used first. Rankers hold the
+# previous constraints/weights of one user, so an edit only redoes the
+# masks and columns it touches. The column arrays they read are shared per
+# dataset; a session only adds its masks, contributions and scores.
+_SESSIONS = OrderedDict()
+MAX_SESSIONS = 32
+
+
+def session_ranker(session: str, path: str, df: pd.DataFrame) -> IncrementalRanker:
+    """The ranker kept for ``session`` over ``df`` (a new one when the dataset changed)."""
+    key = (session, os.path.abspath(path))
+    ranker = _SESSIONS.pop(key, None)
+    if ranker is None or ranker.df is not df:
+        columns = cached_for_dataset(path, "columns", lambda: DatasetColumns(df))
+        if columns.df is not df:
+            columns = DatasetColumns(df)  # e.g. a --memory-report run loads its own frame
+        ranker = IncrementalRanker(df, columns=columns)
+    _SESSIONS[key] = ranker
+    while len(_SESSIONS) > MAX_SESSIONS:
+        _SESSIONS.popitem(last=False)
+    return ranker
+
+
+# Solved GraphWorld per filtered row set, least recently used first. The
+# transition artifact, the MDP solve and the per-column subtree bounds only
+# depend on the rows, so a request that only changes weights reuses them.
+_GRAPHS = OrderedDict()
+MAX_GRAPHS = 4
+
+
+def cached_graph_world(key, probability_path):
+    """The GraphWorld stored under ``key``, if the artifact file still holds its graph."""
+    hit = _GRAPHS.get(key)
+    if hit is None or not os.path.exists(probability_path) or dataset_version(probability_path) != hit[0]:
+        return None
+    _GRAPHS.move_to_end(key)
+    return hit[1]
+
+
+def store_graph_world(key, probability_path, gw):
+    _GRAPHS[key] = (dataset_version(probability_path), gw)
+    _GRAPHS.move_to_end(key)
+    while len(_GRAPHS) > MAX_GRAPHS:
+        _GRAPHS.popitem(last=False)
+
+
+def parse_args(argv=None):
     p = argparse.ArgumentParser(description="Compute ranked list from constraints + rewards")
     p.add_argument("--constraints-json", required=True, help="Path to JSON with constraints_map + reward_values")
     p.add_argument("--dataset", required=True, help="Path to dataset CSV")
     p.add_argument("--probability", default=None, help="Optional path to transition/probability CSV to write")
-    p.add_argument("--output", required=True, help="Where to save ranked list CSV")
+    p.add_argument("--output", default=None, help="Optional: also save the ranked list as CSV")
+    p.add_argument(
+        "--result-store",
+        default=None,
+        help="Where to save the ranked list as a paged binary result (row positions + scores)",
+    )
     p.add_argument("--json-output", required=True, help="Where to save ranked list JSON")
     p.add_argument("--topk", type=int, default=0, help="Optional: keep only top-K rows (0 = keep all)")
+    p.add_argument(
+        "--scoring",
+        choices=["full", "graph", "ta"],
+        default="full",
+        help="Top-K strategy: score every row, branch-and-bound over the GraphWorld "
+             "hierarchy (needs --probability), or run the Threshold Algorithm over "
+             "pre-sorted columns (kept per dataset by a warm scheduler worker; only "
+             "faster than full scoring on large, lightly filtered catalogues). "
+             "Only used with --topk",
+    )
+    p.add_argument(
+        "--session",
+        default=None,
+        help="Optional session key (the scheduler passes the user): keep an incremental ranker "
+             "for it in this process, so repeated runs re-filter and re-score only what changed. "
+             "Used with full scoring",
+    )
+    p.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Print per-column dataset memory before/after the compact schema",
+    )
+    p.add_argument(
+        "--sensitivity-output",
+        default=None,
+        help="Optional: write per-row top-K frequency and rank quantiles under perturbed weights (CSV)",
+    )
+    p.add_argument(
+        "--sensitivity-samples", type=int, default=2000, help="Weight samples for --sensitivity-output"
+    )
+    p.add_argument(
+        "--graph-export",
+        default=None,
+        help="Optional: write a level-of-detail JSON view of the MDP graph (needs --probability)",
+    )
+    p.add_argument(
+        "--graph-root",
+        type=int,
+        default=None,
+        help="State key the --graph-export view starts at (default: the states without a parent)",
+    )
+    p.add_argument("--graph-depth", type=int, default=2, help="Levels expanded by --graph-export")
+    p.add_argument("--graph-top-n", type=int, default=10, help="Children kept per node by --graph-export")
+    p.add_argument(
+        "--graph-save",
+        default=None,
+        help="Optional: save this job's solved graph (.npz, see graph_world.GraphView) so later "
+             "drill-downs (graph_world.py --serve) expand it without re-running the job",
+    )
     p.add_argument(
         "--arch-cols",
         nargs="+",
         default=["domain", "algorithm", "model"],
         help="Columns used as model architecture keys for transition generation",
     )
-    return p.parse_args()
+    p.add_argument(
+        "--precision",
+        choices=["float64", "float32"],
+        default="float64",
+        help="Transition model / MDP solver precision (float32 is refined to float64 at the end)",
+    )
+    args = p.parse_args(argv)
+    if not args.output and not args.result_store and not args.graph_export and not args.graph_save:
+        p.error("at least one of --output, --result-store, --graph-export or --graph-save is required")
+    return args
+
+
+def ensure_parent_dir(path: str):
+    """Create the directory ``path`` is written to (nothing to do for a bare file name)."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
 
 
 def load_constraints(path_json):
@@ -67,30 +194,46 @@ def load_constraints(path_json):
     return constraints_map, weights
 
 
-def compute_weighted_utility(df: pd.DataFrame, weights: dict, constraints_map: dict) -> pd.Series:
+def build_threshold_index(df: pd.DataFrame) -> ThresholdIndex:
+    """Sorted access lists over every numeric column of ``df`` (UP/DOWN_BETTER direction)."""
+    numeric = {}
+    for col in df.columns:
+        if pd.to_numeric(df[col], errors="coerce").notna().sum() > 0:
+            numeric[col] = higher_is_better(col)
+    return ThresholdIndex(df, numeric)
+
+
+def utility_contributions(df: pd.DataFrame, weights: dict, constraints_map: dict, bounds=None) -> pd.DataFrame:
     """
+    Per-column (unweighted) utility contributions, one column per key in ``weights``.
+
     - Numeric columns: min-max normalized (↑ for UP_BETTER, ↓ for DOWN_BETTER).
     - Categorical: if a constraint selected a value for that column, rows matching get 1 else 0.
       If no chosen value exists (after filtering), contribute neutral 1s.
-    """
-    if df.empty:
-        return pd.Series([], dtype=float)
+    - Missing values contribute 0. Unknown columns are left out.
 
-    total = pd.Series(np.zeros(len(df)), index=df.index, dtype=float)
+    ``bounds`` ({column: (min, max)}) marks the numeric columns and supplies
+    their normalization range, for scoring a subset of a larger frame.
+    """
+    contribs = {}
 
-    for raw_col, w in weights.items():
+    for raw_col in weights:
         # Prefer exact column, fall back to Utils._resolve_col (case-insensitive + aliases)
         col = raw_col if raw_col in df.columns else Utils._resolve_col(df, raw_col)
         if not col:
             continue
 
-        numeric = pd.to_numeric(df[col], errors="coerce")
-        if numeric.notna().sum() > 0:
-            # decide direction
-            cname = col if col in UP_BETTER or col in DOWN_BETTER else col.lower()
-            higher = (cname in UP_BETTER) or (cname not in DOWN_BETTER)
-            norm = normalize_numeric(df[col], higher_is_better=higher)
-            total = total.add(w * norm, fill_value=0.0)
+        if bounds is None:
+            is_numeric = pd.to_numeric(df[col], errors="coerce").notna().sum() > 0
+        else:
+            is_numeric = col in bounds
+
+        if is_numeric:
+            contrib = normalize_numeric(
+                df[col],
+                higher_is_better=higher_is_better(col),
+                bounds=None if bounds is None else bounds[col],
+            )
         else:
             # categorical: reward match against chosen constraint value if present
             chosen = constraints_map.get(col, None)
@@ -98,13 +241,287 @@ def compute_weighted_utility(df: pd.DataFrame, weights: dict, constraints_map: d
                 contrib = pd.Series(np.ones(len(df)), index=df.index)  # neutral
             else:
                 contrib = (df[col].astype(str) == str(chosen)).astype(float)
-            total = total.add(w * contrib, fill_value=0.0)
+        contribs[raw_col] = contrib.fillna(0.0)
+
+    return pd.DataFrame(contribs, index=df.index, dtype=float)
+
+
+def graph_contribution_bounds(gw: GraphWorld, raw_col: str, constraints_map: dict, leaf_column: str):
+    """
+    (upper, lower) arrays over all states of ``gw``: bounds on the
+    ``utility_contributions`` value of ``raw_col`` for the leaves below each
+    state, with leaves matched to rows by ``leaf_column`` (see
+    ``GraphWorld.leaf_rows``). At a leaf state both equal the row's own
+    contribution. None for unknown columns.
+
+    Built from ``gw.subtree_bounds`` on the raw column (min-max
+    normalization is monotone) and cached in ``gw.contribution_bounds``.
+    """
+    df = gw.data
+    col = raw_col if raw_col in df.columns else Utils._resolve_col(df, raw_col)
+    if not col:
+        return None
+
+    cache = gw.contribution_bounds
+    if ("numeric", col) not in cache:
+        cache[("numeric", col)] = pd.to_numeric(df[col], errors="coerce").notna().sum() > 0
+    is_numeric = cache[("numeric", col)]
+    chosen = None if is_numeric else constraints_map.get(col, None)
+    key = (leaf_column, col, None if chosen is None else str(chosen))
+
+    if key not in cache:
+        if is_numeric:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy()
+            subtree_max, subtree_min, has_nan = gw.subtree_bounds(values, leaf_column)
+            bounds = (np.nanmin(values), np.nanmax(values))
+            better = higher_is_better(col)
+            best, worst = (subtree_max, subtree_min) if better else (subtree_min, subtree_max)
+            with np.errstate(invalid="ignore"):
+                upper = normalize_numeric(pd.Series(best), better, bounds=bounds).to_numpy(dtype=float, copy=True)
+                lower = normalize_numeric(pd.Series(worst), better, bounds=bounds).to_numpy(dtype=float, copy=True)
+            # Missing values contribute 0
+            no_values = np.isinf(subtree_max)
+            upper[no_values] = 0.0
+            lower[no_values] = 0.0
+            lower[has_nan] = np.minimum(lower[has_nan], 0.0)
+        elif chosen is None:
+            upper = lower = np.ones(gw.num_states)  # neutral
+        else:
+            match = (df[col].astype(str) == str(chosen)).to_numpy(dtype=float)
+            upper, lower, _ = gw.subtree_bounds(match, leaf_column)
+            upper = np.where(np.isinf(upper), 0.0, upper)
+            lower = np.where(np.isinf(lower), 0.0, lower)
+        cache[key] = (upper, lower)
+    return cache[key]
+
+
+def graph_top_k(gw: GraphWorld, weights: dict, constraints_map: dict, topk: int, leaf_column: str):
+    """
+    Top-K rows of ``gw.data`` by weighted utility, via ``gw.top_k_leaves``
+    with the leaf states matched to rows by their ``leaf_column`` label.
+    Same rows, scores and order as a stable sort of ``compute_weighted_utility``;
+    only the states the search visits are scored.
+
+    None when the graph's leaves do not map one to one onto the rows (e.g.
+    repeated model names); the caller then scores every row.
+    """
+    if gw.leaf_rows(leaf_column) is None:
+        return None
+
+    columns = []
+    for raw_col, w in weights.items():
+        found = graph_contribution_bounds(gw, raw_col, constraints_map, leaf_column)
+        if found is not None:
+            columns.append((w, found[0], found[1]))
+
+    def node_bound(states):
+        total = np.zeros(len(states))
+        for w, upper, lower in columns:
+            if w > 0:
+                total += w * upper[states]
+            elif w < 0:
+                total += w * lower[states]
+        return total
+
+    def leaf_score(states):
+        # Same accumulation order as compute_weighted_utility
+        total = np.zeros(len(states))
+        for w, upper, _ in columns:
+            total = total + w * upper[states]
+        return total
+
+    return gw.top_k_leaves(topk, node_bound, leaf_score, leaf_column)
+
+
+def _threshold_candidates(df: pd.DataFrame, weights: dict, sorted_index: ThresholdIndex, topk: int):
+    """
+    Candidate labels for ``topk`` from a Threshold Algorithm pass over
+    ``sorted_index`` (built on the unfiltered dataset; ``df`` selects the
+    rows), plus the normalization bounds of ``df``. None if it cannot answer.
+    """
+    positions = sorted_index.index.get_indexer(df.index)
+    if (positions < 0).any():
+        return None
+
+    bounds, ta_weights = {}, {}
+    for raw_col, w in weights.items():
+        col = raw_col if raw_col in df.columns else Utils._resolve_col(df, raw_col)
+        if not col:
+            continue
+        s_num = pd.to_numeric(df[col], errors="coerce")
+        if s_num.notna().sum() == 0:
+            continue  # categorical: constant once the hard filter is applied
+        if col not in sorted_index.orders or w < 0:
+            return None
+        bounds[col] = (np.nanmin(s_num.values), np.nanmax(s_num.values))
+        ta_weights[col] = ta_weights.get(col, 0.0) + w
+
+    mask = np.zeros(len(sorted_index.index), dtype=bool)
+    mask[positions] = True
+    rows = sorted_index.top_k(ta_weights, topk, bounds=bounds, mask=mask)
+    return sorted_index.index[rows], bounds
+
+
+def compute_weighted_utility(
+    df: pd.DataFrame,
+    weights: dict,
+    constraints_map: dict,
+    topk: int = 0,
+    sorted_index: ThresholdIndex = None,
+) -> pd.Series:
+    """
+    Weighted sum of ``utility_contributions`` (see there for the per-column rules).
+
+    With ``topk > 0`` only the rows that can reach the top K are scored and
+    the returned Series is indexed by those rows; their scores equal the
+    full computation. Candidates come from ``sorted_index``: built once over
+    the whole dataset, a Threshold Algorithm pass that reads only a prefix
+    of each sorted column and treats ``df``'s rows as the hard-filter mask.
+
+    Falls back to scoring every row when the index does not cover the
+    weights (negative weights, or numeric columns outside the index).
+    """
+    if df.empty:
+        return pd.Series([], dtype=float)
+
+    bounds = None
+    if sorted_index is not None and topk > 0:
+        found = _threshold_candidates(df, weights, sorted_index, topk)
+        if found is not None:
+            candidates, bounds = found
+            df = df.loc[candidates]
+
+    total = pd.Series(np.zeros(len(df)), index=df.index, dtype=float)
+
+    contribs = utility_contributions(df, weights, constraints_map, bounds=bounds)
+    for raw_col in contribs.columns:
+        total = total + weights[raw_col] * contribs[raw_col]
 
     return total
 
 
-def main():
-    args = parse_args()
+def sample_weights(weights: np.ndarray, n_samples: int, method: str = "dirichlet",
+                   epsilon: float = 0.1, concentration: float = 50.0, rng=None) -> np.ndarray:
+    """
+    Perturbed copies of ``weights`` as an (n_features, n_samples) matrix.
+
+    - "dirichlet": proportions drawn from Dirichlet(concentration * w / sum(w)),
+      rescaled to sum(w). Larger ``concentration`` keeps samples closer to w.
+    - "jitter": every weight scaled by an independent U(1 - epsilon, 1 + epsilon),
+      clipped at 0.
+    Zero weights stay zero in both modes.
+    """
+    rng = np.random.default_rng(rng)
+    weights = np.asarray(weights, dtype=float)
+
+    if method == "jitter":
+        factors = rng.uniform(1.0 - epsilon, 1.0 + epsilon, size=(len(weights), n_samples))
+        return np.clip(weights[:, None] * factors, 0.0, None)
+
+    if method == "dirichlet":
+        if np.any(weights < 0):
+            raise ValueError("Dirichlet sampling needs non-negative weights.")
+        samples = np.zeros((len(weights), n_samples))
+        active = weights > 0
+        if active.any():
+            total = weights[active].sum()
+            alpha = concentration * weights[active] / total
+            samples[active] = rng.dirichlet(alpha, size=n_samples).T * total
+        return samples
+
+    raise ValueError(f"Unknown sampling method: {method}")
+
+
+def weight_sensitivity(
+    df: pd.DataFrame,
+    weights: dict,
+    constraints_map: dict,
+    n_samples: int = 2000,
+    method: str = "dirichlet",
+    epsilon: float = 0.1,
+    concentration: float = 50.0,
+    top_k: int = 10,
+    quantiles=(0.05, 0.5, 0.95),
+    chunk_cells: int = 4_000_000,
+    seed=None,
+) -> pd.DataFrame:
+    """
+    Monte Carlo robustness of the ranking under perturbed weights.
+
+    Samples ``n_samples`` weight vectors around ``weights`` (see
+    ``sample_weights``) and scores them all as one
+    (rows x features) @ (features x samples) product over
+    ``utility_contributions``. Samples are processed in chunks of about
+    ``chunk_cells`` score cells; beyond that, memory is one small-integer
+    count per row and rank bucket.
+
+    Returns one row per row of ``df`` with:
+      - ``topk_frequency``: share of samples in which the row ranks in the top ``top_k``
+      - ``rank_q<NN>``: rank quantiles (1 = best). Ranks up to ``4 * top_k``
+        are tracked exactly; deeper ranks are bucketed geometrically and
+        reported as the upper end of their bucket.
+    """
+    if df.empty:
+        return pd.DataFrame(index=df.index)
+
+    contribs = utility_contributions(df, weights, constraints_map)
+    X = contribs.to_numpy(dtype=float)
+    W = sample_weights(
+        [weights[c] for c in contribs.columns], n_samples,
+        method=method, epsilon=epsilon, concentration=concentration, rng=seed,
+    )
+
+    n = len(df)
+    exact = min(n, 4 * top_k)
+    edges = np.unique(np.concatenate([
+        np.arange(exact + 1),
+        np.round(np.geomspace(max(exact, 1), n, 32)).astype(np.int64),
+    ]))
+    num_bins = len(edges) - 1
+    count_dtype = np.uint16 if n_samples <= np.iinfo(np.uint16).max else np.uint32
+    rank_hist = np.zeros((num_bins, n), dtype=count_dtype)  # bucket-major: one bincount per bucket
+    in_top_k = np.zeros(n, dtype=np.int64)
+
+    # Bucket boundaries below the exact ranks; argpartition puts every row
+    # in its bucket without sorting inside the buckets.
+    kth = edges[(edges >= exact) & (edges < n)]
+    # Ranks break ties by frame order: complex keys compare the real part
+    # (-score) first, then the imaginary part (row position).
+    tiebreak = 1j * np.arange(n)[:, None]
+
+    chunk = max(1, chunk_cells // n)
+    for start in range(0, n_samples, chunk):
+        key = tiebreak - X @ W[:, start:start + chunk]
+        if len(kth):
+            order = np.argpartition(key, kth, axis=0)
+        else:
+            order = np.broadcast_to(np.arange(n)[:, None], key.shape).copy()
+
+        # Exact order of the best ``exact`` rows of every sample
+        top = order[:exact]
+        top_order = np.argsort(np.take_along_axis(key, top, axis=0), axis=0)
+        order[:exact] = np.take_along_axis(top, top_order, axis=0)
+
+        in_top_k += np.bincount(order[:top_k].ravel(), minlength=n)
+        for b in range(num_bins):
+            counts = np.bincount(order[edges[b]:edges[b + 1]].ravel(), minlength=n)
+            np.add(rank_hist[b], counts, out=rank_hist[b], casting="unsafe")
+
+    result = pd.DataFrame({"topk_frequency": in_top_k / n_samples}, index=df.index)
+    first_bins = {q: np.empty(n, dtype=np.int64) for q in quantiles}
+    block = max(1, chunk_cells // num_bins)
+    for lo in range(0, n, block):
+        cumulative = np.cumsum(rank_hist[:, lo:lo + block], axis=0, dtype=np.int64)
+        for q in quantiles:
+            first_bins[q][lo:lo + block] = np.argmax(cumulative >= q * n_samples, axis=0)
+    for q in quantiles:
+        result[f"rank_q{int(round(q * 100)):02d}"] = edges[first_bins[q] + 1]  # 1-based upper end
+    return result
+
+
+def main(argv=None):
+    """Run one ranking job; ``argv`` defaults to the command line. Returns the ranked row count."""
+    args = parse_args(argv)
     t0 = time.time()
 
     # 1) Load inputs
@@ -113,67 +530,179 @@ def main():
     # 2) Load dataset
     if not os.path.exists(args.dataset):
         raise FileNotFoundError(f"Dataset not found: {args.dataset}")
-    df = pd.read_csv(args.dataset)
-
-    # 3) Apply HARD constraints (no synthetic generation)
-    df_filtered = Utils.filter_dataFrame(df, constraints_map)
+    if args.memory_report:
+        df = load_dataset(args.dataset, report=True)
+    else:
+        df = cached_for_dataset(args.dataset, "frame", lambda: load_dataset(args.dataset))
+
+    # 3) Apply HARD constraints (no synthetic generation). A session ranker
+    #    filters and scores in one go, from the state of its previous run.
+    session_utility = None
+    if args.session and not (args.topk > 0 and args.scoring != "full"):
+        ranker = session_ranker(args.session, args.dataset, df)
+        session_utility = ranker.update(constraints_map, weights)
+        df_filtered = df.loc[session_utility.index].copy()
+    else:
+        df_filtered = Utils.filter_dataFrame(df, constraints_map)
 
     # ensure output dirs
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    os.makedirs(os.path.dirname(args.json_output), exist_ok=True)
+    for out_path in (args.output, args.result_store, args.json_output):
+        if out_path:
+            ensure_parent_dir(out_path)
 
     # Early exit: no rows
     if df_filtered.empty:
-        pd.DataFrame().to_csv(args.output, index=False)
+        if args.output:
+            pd.DataFrame().to_csv(args.output, index=False)
+        if args.result_store:
+            write_ranked_result(args.result_store, [], [], args.dataset)
         print("[main.py] Filter removed all rows; wrote empty ranked list.")
-        return
+        return 0
 
-    # 4) Optional: produce/refresh transition model artifact if a path was provided
+    # 4) Optional: produce/refresh transition model artifact if a path was provided.
+    #    A worker that already solved the graph for these rows reuses it.
+    gw, graph_key = None, None
     if args.probability:
+        graph_key = (
+            os.path.abspath(args.probability),
+            dataset_version(args.dataset),
+            hash(df_filtered.index.to_numpy().tobytes()),
+            tuple(args.arch_cols),
+            args.precision,
+            args.topk,
+        )
+        gw = cached_graph_world(graph_key, args.probability)
+    if args.probability and gw is None:
         try:
-            os.makedirs(os.path.dirname(args.probability), exist_ok=True)
+            ensure_parent_dir(args.probability)
             generate_initial_transition_model(
                 df_filtered,
                 df_filtered,
                 modelArchitecture=args.arch_cols,
                 file_name=args.probability,
+                dtype=args.precision,
             )
         except Exception as e:
             print(f"[main.py] Transition artifact step skipped: {e}")
 
     # 5) Compute weighted utility (3/2/1) robustly for mixed types
+    #    (the graph search in step 7 only scores the leaves it visits)
     df_scores = df_filtered.copy()
-    df_scores["utility_value"] = compute_weighted_utility(df_scores, weights, constraints_map)
+    graph_search = args.scoring == "graph" and args.topk > 0
+    if args.scoring == "ta" and args.topk > 0:
+        sorted_index = cached_for_dataset(args.dataset, "threshold", lambda: build_threshold_index(df))
+        utility = compute_weighted_utility(
+            df_filtered, weights, constraints_map, topk=args.topk, sorted_index=sorted_index
+        )
+        df_scores = df_scores.loc[utility.index]
+        df_scores["utility_value"] = utility
+    elif session_utility is not None:
+        df_scores["utility_value"] = session_utility
+    elif not graph_search:
+        df_scores["utility_value"] = compute_weighted_utility(df_scores, weights, constraints_map)
 
     # 6) Optional: run MDP to keep artifacts compatible (safe no-op for ranking)
     try:
-        if args.probability and os.path.exists(args.probability):
-            gw = GraphWorld(df_filtered, args.probability, {}, {})
+        if gw is None and args.probability and os.path.exists(args.probability):
+            gw = GraphWorld(df_filtered, args.probability, {}, {}, dtype=args.precision)
             solver = PolicyIteration(
                 gw.reward_function,
                 gw.transition_model,
                 gamma=0.9,
                 theta=0.005,
                 # max_iters left as default in the class
+                dtype=args.precision,
+            )
+            t_solve = time.time()
+            sweeps = []
+            if args.topk and args.topk > 0:
+                # Only the top-K leaf order matters here: stop once it is certified.
+                leaf_indices = np.arange(gw.num_states - len(gw.data), gw.num_states)
+                utilities, _ = solver.get_ranked_utility_values(
+                    leaf_indices, args.topk, callback=lambda *a: sweeps.append(a[0])
+                )
+            else:
+                utilities = solver.get_utility_values(callback=lambda *a: sweeps.append(a[0]))
+            residual = "" if solver.residual is None else (
+                f", float64 residual {solver.residual:.2e} after {solver.refine_iters} refine sweep(s)"
+            )
+            print(
+                f"[main.py] MDP solve ({args.precision}): {time.time() - t_solve:.3f}s, "
+                f"{len(sweeps)} sweeps, P={solver.probability_matrix.nbytes:,} bytes{residual}"
             )
-            gw.set_utility_values(solver.get_utility_values())
+            gw.set_utility_values(utilities)
+            store_graph_world(graph_key, args.probability, gw)
     except Exception as e:
+        gw = None
         print(f"[main.py] Graph/MDP step skipped due to: {e}")
 
-    # 7) Sort and truncate
-    ranked = df_scores.sort_values(by="utility_value", ascending=False).reset_index(drop=True)
-    if args.topk and args.topk > 0:
-        ranked = ranked.head(args.topk)
+    # Optional: level-of-detail view of the graph for the frontend, and the
+    # graph itself for later drill-downs. Kept out of the MDP step so a bad
+    # export path or root cannot disable graph search.
+    if args.graph_export or args.graph_save:
+        try:
+            if gw is None:
+                raise ValueError("the transition artifact / MDP step is not available")
+            view = gw.graph_view()
+            if args.graph_save:
+                ensure_parent_dir(args.graph_save)
+                view.save(args.graph_save)
+            if args.graph_export:
+                ensure_parent_dir(args.graph_export)
+                view.export_graph_json(
+                    args.graph_export, root=args.graph_root, depth=args.graph_depth, top_n=args.graph_top_n
+                )
+        except Exception as e:
+            print(f"[main.py] Graph export skipped due to: {e}")
 
-    # 8) Save CSV AND JSON (server reads JSON; CSV is for download/inspection)
-    ranked.to_csv(args.output, index=False)
-    
+    # 7) Sort and truncate
+    hits = None
+    if graph_search and gw is not None:
+        # Branch-and-bound over the GraphWorld hierarchy: same rows and order
+        # as the stable sort below, without scoring dominated subtrees.
+        hits = graph_top_k(gw, weights, constraints_map, args.topk, leaf_column=args.arch_cols[-1])
+    if hits is not None:
+        ranked = df_scores.iloc[[pos for pos, _ in hits]].copy()
+        ranked["utility_value"] = [score for _, score in hits]
+    else:
+        if graph_search:
+            reason = "the transition artifact" if gw is None else f"one graph leaf per {args.arch_cols[-1]!r} value"
+            print(f"[main.py] Graph search needs {reason}; using full scoring.")
+            df_scores["utility_value"] = compute_weighted_utility(df_scores, weights, constraints_map)
+        ranked = df_scores.sort_values(by="utility_value", ascending=False, kind="mergesort")
+        if args.topk and args.topk > 0:
+            ranked = ranked.head(args.topk)
+
+    # 8) Save the paged binary result (server reads this; rows are dataset
+    #    positions) and, if asked, the CSV for download/inspection
+    if args.result_store:
+        write_ranked_result(
+            args.result_store,
+            ranked.index.to_numpy(),
+            ranked["utility_value"].to_numpy(),
+            args.dataset,
+        )
+    if args.output:
+        ranked.reset_index(drop=True).to_csv(args.output, index=False)
+
+    # 9) Optional: weight-sensitivity report over the filtered rows
+    if args.sensitivity_output:
+        ensure_parent_dir(args.sensitivity_output)
+        report = weight_sensitivity(
+            df_filtered,
+            weights,
+            constraints_map,
+            n_samples=args.sensitivity_samples,
+            top_k=args.topk if args.topk > 0 else 10,
+        )
+        df_filtered.join(report).sort_values("topk_frequency", ascending=False, kind="mergesort").to_csv(
+            args.sensitivity_output, index=False
+        )
 
     dt = time.time() - t0
-    print(
-        f"[main.py] Ranked list saved to: {args.output} & {args.json_output}  "
-        f"(rows={len(ranked)})  in {dt:.2f}s"
-    )
+    saved = " & ".join(p for p in (args.result_store, args.output) if p) or "(not requested)"
+    print(f"[main.py] Ranked list saved to: {saved}  (rows={len(ranked)})  in {dt:.2f}s")
+    return len(ranked)
 
 
 if __name__ == "__main__":
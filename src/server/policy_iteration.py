@@ -10,11 +10,17 @@ class PolicyIteration:
     where:
         - R is the reward_function (shape: [num_states])
         - P is the probability_matrix (shape: [num_states, num_states])
+
+    ``dtype=np.float32`` runs the sweeps in single precision, which halves
+    the memory traffic of the ``P @ V`` product. The result is then checked
+    and refined in float64 (see ``refine``), so callers always get float64
+    utilities that satisfy the float64 stopping rule.
     """
 
-    def __init__(self, reward_function, probability_matrix, gamma, theta, max_iters=10_000):
-        probability_matrix = np.asarray(probability_matrix, dtype=float)
-        reward_function = np.nan_to_num(np.asarray(reward_function, dtype=float))
+    def __init__(self, reward_function, probability_matrix, gamma, theta, max_iters=10_000, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        probability_matrix = np.asarray(probability_matrix, dtype=self.dtype)
+        reward_function = np.nan_to_num(np.asarray(reward_function, dtype=self.dtype))
 
         num_states = probability_matrix.shape[0]
 
@@ -44,24 +50,25 @@ class PolicyIteration:
         self.theta = float(theta)
         self.max_iters = int(max_iters)
 
-    def get_utility_values(self):
+        # Set by refine(): float64 sweeps run and the last float64 residual.
+        self.refine_iters = 0
+        self.residual = None
+
+    def iter_utility_values(self):
         """
-        Perform synchronous value iteration:
+        Generator form of synchronous value iteration:
 
             V_{k+1} = R + gamma * P V_k
 
-        until the max change ||V_{k+1} - V_k||_∞ < theta,
-        or until max_iters is reached.
-
-        Returns
-        -------
-        utilities : np.ndarray
-            Vector of shape [num_states] with the estimated utilities.
+        Yields ``(iteration, utilities, delta)`` after every sweep, where
+        ``delta = ||V_{k+1} - V_k||_∞``, until delta < theta or max_iters
+        sweeps have run. Callers may stop early (e.g. to stream provisional
+        rankings) simply by not asking for the next value.
         """
-        utilities = np.zeros(self.num_states, dtype=float)
+        utilities = np.zeros(self.num_states, dtype=self.dtype)
 
-        for _ in range(self.max_iters):
-            temp_utilities = utilities.copy()
+        for iteration in range(1, self.max_iters + 1):
+            temp_utilities = utilities
 
             # vectorized Bellman update
             utilities = self.reward_function + self.gamma * (
@@ -71,9 +78,128 @@ class PolicyIteration:
             # sup-norm difference
             delta = np.max(np.abs(temp_utilities - utilities))
 
+            yield iteration, utilities, delta
+
             if delta < self.theta:
-                return utilities
+                return
+
+    def _matvec64(self, values, block_bytes=1 << 25):
+        """``P @ values`` in float64, upcasting ``P`` a block of rows at a time."""
+        P = self.probability_matrix
+        if P.dtype == np.float64:
+            return P @ values
+        rows = max(1, block_bytes // (8 * max(self.num_states, 1)))
+        out = np.empty(self.num_states, dtype=np.float64)
+        for start in range(0, self.num_states, rows):
+            out[start:start + rows] = P[start:start + rows].astype(np.float64) @ values
+        return out
+
+    def refine(self, utilities, stop=None):
+        """
+        Float64 residual check and refinement of a (lower precision) estimate.
+
+        Runs float64 sweeps from ``utilities`` until the change drops below
+        theta, or ``stop(utilities, delta)`` returns True. A float32 run
+        that already converged typically needs a single sweep, which is the
+        residual check itself. Returns ``(utilities, delta)`` in float64.
+        """
+        reward = self.reward_function.astype(np.float64)
+        utilities = np.asarray(utilities, dtype=np.float64)
+        delta = np.inf
+
+        self.refine_iters = 0
+        for _ in range(self.max_iters):
+            new_utilities = reward + self.gamma * self._matvec64(utilities)
+            delta = float(np.max(np.abs(new_utilities - utilities)))
+            utilities = new_utilities
+            self.refine_iters += 1
+            if delta < self.theta or (stop is not None and stop(utilities, delta)):
+                break
+
+        self.residual = delta
+        return utilities, delta
+
+    def error_bound(self, delta):
+        """
+        Contraction bound on ||V* - V_{k+1}||_∞ given the last sweep's change:
+        gamma / (1 - gamma) * delta.
+        """
+        return self.gamma / (1.0 - self.gamma) * delta
+
+    def get_utility_values(self, callback=None):
+        """
+        Perform synchronous value iteration (see ``iter_utility_values``)
+        until the max change ||V_{k+1} - V_k||_∞ < theta,
+        or until max_iters is reached.
 
-        # If we reach here, we hit the cutoff without satisfying theta.
-        # We still return the last estimate.
+        ``callback(iteration, utilities, delta)``, if given, is called after
+        every sweep.
+
+        Returns
+        -------
+        utilities : np.ndarray
+            Vector of shape [num_states] with the estimated utilities.
+        """
+        utilities = np.zeros(self.num_states, dtype=float)
+
+        for iteration, utilities, delta in self.iter_utility_values():
+            if callback is not None:
+                callback(iteration, utilities, delta)
+
+        if self.dtype != np.float64:
+            utilities, _ = self.refine(utilities)
+
+        # If we hit the cutoff without satisfying theta we still return the
+        # last estimate.
         return utilities
+
+    def top_k_is_certain(self, utilities, delta, leaf_indices, top_k):
+        """
+        True when the order of the ``top_k`` best leaves can no longer change.
+
+        Every true utility lies within ``eps = error_bound(delta)`` of the
+        current estimate, so the order is fixed once each consecutive gap
+        among the best ``top_k + 1`` leaves exceeds ``2 * eps``.
+        """
+        values = np.asarray(utilities)[leaf_indices]
+        if len(values) <= 1:
+            return True
+
+        head = min(top_k + 1, len(values))
+        best = np.partition(-values, head - 1)[:head]
+        best = np.sort(-best)[::-1]
+        return bool(np.all(best[:-1] - best[1:] > 2.0 * self.error_bound(delta)))
+
+    def get_ranked_utility_values(self, leaf_indices, top_k, callback=None):
+        """
+        Anytime value iteration: like ``get_utility_values`` but stops as soon
+        as the order of the ``top_k`` best states in ``leaf_indices`` is
+        certified by ``top_k_is_certain``, which for high gamma usually
+        happens long before delta < theta.
+
+        Returns ``(utilities, certified)``; ``certified`` is False when the
+        run ended on theta/max_iters before the order was proven.
+        """
+        leaf_indices = np.asarray(leaf_indices, dtype=int)
+        if top_k <= 0:
+            raise ValueError("top_k must be a positive integer.")
+
+        utilities = np.zeros(self.num_states, dtype=float)
+        certified = False
+
+        for iteration, utilities, delta in self.iter_utility_values():
+            if callback is not None:
+                callback(iteration, utilities, delta)
+            if self.top_k_is_certain(utilities, delta, leaf_indices, top_k):
+                certified = True
+                break
+
+        if self.dtype != np.float64:
+            # float32 rounding can fake a certificate: redo it in float64.
+            def stop(values, delta):
+                return self.top_k_is_certain(values, delta, leaf_indices, top_k)
+
+            utilities, delta = self.refine(utilities, stop=stop)
+            certified = stop(utilities, delta)
+
+        return utilities, certified
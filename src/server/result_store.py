@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from dataset import dataset_version, load_dataset
+
+
+# Binary layout (little-endian):
+#   0  magic        4s   b"OXRS"
+#   4  version      u32
+#   8  row_count    u64
+#   16 meta_len     u32  length of the UTF-8 JSON metadata that follows
+#   20 data_offset  u32  start of the arrays (8-byte aligned)
+#   24 metadata     JSON {"dataset": ..., "dataset_version": ..., ...}
+#   data_offset                 positions int64[row_count]  (dataset row numbers, best first)
+#   data_offset + 8 * row_count scores    float64[row_count]
+MAGIC = b"OXRS"
+VERSION = 1
+_HEADER = struct.Struct("<4sIQII")
+
+
+def write_ranked_result(path: str, positions, scores, dataset_path: str, **meta):
+    """
+    Persist a ranking as row positions into the dataset plus their scores.
+
+    The file is written next to its final name and renamed into place, so
+    readers never see a half-written result.
+    """
+    positions = np.ascontiguousarray(positions, dtype="<i8")
+    scores = np.ascontiguousarray(scores, dtype="<f8")
+    if positions.shape != scores.shape or positions.ndim != 1:
+        raise ValueError("positions and scores must be 1-D arrays of the same length.")
+
+    meta = dict(meta, dataset=os.path.abspath(dataset_path), dataset_version=dataset_version(dataset_path))
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    data_offset = _HEADER.size + len(meta_bytes)
+    data_offset += -data_offset % 8
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(positions), len(meta_bytes), data_offset))
+        f.write(meta_bytes)
+        f.write(b"\0" * (data_offset - _HEADER.size - len(meta_bytes)))
+        f.write(positions.tobytes())
+        f.write(scores.tobytes())
+    os.replace(tmp_path, path)
+
+
+class RankedResult:
+    """
+    Read-only view of a file written by ``write_ranked_result``.
+
+    Opening reads only the header; ``page`` reads ``limit`` entries starting
+    at ``offset``, so the cost of serving a page does not depend on how many
+    rows were ranked or how large the dataset is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, row_count, meta_len, data_offset = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a ranked result file.")
+            if version != VERSION:
+                raise ValueError(f"Unsupported ranked result version {version} in {path}.")
+            self.meta = json.loads(f.read(meta_len).decode("utf-8"))
+        self.row_count = int(row_count)
+        self.data_offset = int(data_offset)
+
+    def __len__(self):
+        return self.row_count
+
+    def page(self, offset: int = 0, limit: int = None):
+        """(positions, scores) for ranks ``offset`` .. ``offset + limit - 1``."""
+        offset = max(0, min(int(offset), self.row_count))
+        count = self.row_count - offset if limit is None else max(0, min(int(limit), self.row_count - offset))
+        with open(self.path, "rb") as f:
+            f.seek(self.data_offset + 8 * offset)
+            positions = np.fromfile(f, dtype="<i8", count=count)
+            f.seek(self.data_offset + 8 * (self.row_count + offset))
+            scores = np.fromfile(f, dtype="<f8", count=count)
+        return positions, scores
+
+    def is_current(self) -> bool:
+        """False when the referenced dataset changed since the result was written."""
+        path = self.meta["dataset"]
+        return os.path.exists(path) and dataset_version(path) == self.meta["dataset_version"]
+
+    def page_rows(self, df: pd.DataFrame, offset: int = 0, limit: int = None) -> pd.DataFrame:
+        """Dataset rows for one page, best first, with a ``utility_value`` column."""
+        positions, scores = self.page(offset, limit)
+        rows = df.iloc[positions].reset_index(drop=True)
+        rows["utility_value"] = scores
+        return rows
+
+    def export_csv(self, out_path: str, df: pd.DataFrame = None):
+        """Write the full ranked list as CSV (the download format), on demand."""
+        if df is None:
+            df = load_dataset(self.meta["dataset"])
+        self.page_rows(df).to_csv(out_path, index=False)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Export a binary ranked result as CSV")
+    p.add_argument("result", help="Path to the ranked result file")
+    p.add_argument("--output", required=True, help="Where to save the CSV")
+    p.add_argument("--offset", type=int, default=0, help="First rank to export")
+    p.add_argument("--limit", type=int, default=None, help="Number of rows to export (default: all)")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = RankedResult(args.result)
+    if not result.is_current():
+        raise SystemExit(f"Dataset changed since {args.result} was written; re-run the ranking.")
+    df = load_dataset(result.meta["dataset"])
+    result.page_rows(df, args.offset, args.limit).to_csv(args.output, index=False)
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import main as ranking
+
+
+def run_ranking_job(argv):
+    """Worker entry point: one ``main.py`` run inside a pooled process."""
+    try:
+        return ranking.main(argv)
+    except SystemExit as e:
+        # argparse errors (p.error) exit; as a plain exception it reaches the
+        # scheduler as a failed job instead of stopping its event loop.
+        raise RuntimeError(f"main.py exited with status {e.code} (see scheduler stderr)") from None
+
+
+class RankingScheduler:
+    """
+    asyncio front end over a bounded process pool for ranking jobs.
+
+    - Per-user coalescing: each user key has at most one job running and one
+      pending. Submitting again replaces the pending job, so only the
+      latest constraints are ranked.
+    - Superseded work is dropped. A pending job that is replaced never
+      starts. A job that is already running cannot be interrupted inside
+      the pool, so its result is discarded and the status is not updated.
+    - Global concurrency: at most ``max_workers`` jobs run at once, one per
+      slot. Each slot is a single warm worker process, and a user's jobs go
+      back to the slot that ran their last one while it is free. That is
+      where their ``--session`` ranker (see main.py) and the cached dataset
+      live, so follow-up edits are re-ranked incrementally.
+    - Failures stay per job. A job that exits (argparse errors) or raises
+      is reported as ``error``. If a worker process dies, its slot gets a
+      new process and the job is retried once.
+    - Metrics go through the existing status-file contract:
+      ``<status_dir>/<user>_status.json`` is merged with
+      ``{state, queue_depth, running, wait_ms, ...}`` plus an ISO ``ts``,
+      just like ``writeStatus`` in index.js.
+    """
+
+    def __init__(self, status_dir: str, max_workers: int = 2):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be a positive integer.")
+        self.status_dir = status_dir
+        self.max_workers = int(max_workers)
+        self.pools = [ProcessPoolExecutor(max_workers=1) for _ in range(self.max_workers)]
+        self.busy = [False] * self.max_workers
+        self.home = {}      # user -> slot that ran their last job
+        self.slot_freed = asyncio.Condition()
+
+        self.pending = {}   # user -> job dict (latest submission only)
+        self.workers = {}   # user -> asyncio.Task draining that user's jobs
+        self.running = 0
+        self.completed = 0
+        self.dropped = 0
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": len(self.pending),
+            "running": self.running,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "max_workers": self.max_workers,
+        }
+
+    def write_status(self, user: str, status: dict):
+        """Merge ``status`` into the user's status file (atomic replace)."""
+        path = os.path.join(self.status_dir, f"{user}_status.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                prev = json.load(f)
+        except (OSError, ValueError):
+            prev = {}
+        prev.update(status)
+        prev["ts"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(prev, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def submit(self, user: str, argv: list, result: str = None, latest: str = None):
+        """
+        Queue a ranking for ``user`` (``argv`` as for main.py). ``result`` is the
+        file the job writes; ``latest`` an optional stable copy of it.
+        """
+        if user in self.pending:
+            self.dropped += 1
+        self.pending[user] = {
+            "argv": list(argv) + ["--session", user],
+            "result": result,
+            "latest": latest,
+            "submitted": time.monotonic(),
+        }
+        self.write_status(user, {"state": "queued", "error": None, **self.metrics()})
+
+        if user not in self.workers:
+            self.workers[user] = asyncio.ensure_future(self._drain(user))
+
+    async def _drain(self, user: str):
+        try:
+            while user in self.pending:
+                slot = await self._acquire(user)
+                try:
+                    # Take the latest job only once a slot is free, so
+                    # anything submitted while waiting replaces it.
+                    job = self.pending.pop(user)
+                    await self._run(user, job, slot)
+                finally:
+                    await self._release(slot)
+        finally:
+            self.workers.pop(user, None)
+
+    async def _acquire(self, user: str) -> int:
+        """Wait for a free slot, preferring the user's home slot."""
+        async with self.slot_freed:
+            while True:
+                home = self.home.get(user, zlib.crc32(user.encode("utf-8")) % self.max_workers)
+                if not self.busy[home]:
+                    slot = home
+                    break
+                free = [i for i, busy in enumerate(self.busy) if not busy]
+                if free:
+                    slot = free[0]
+                    break
+                await self.slot_freed.wait()
+            self.busy[slot] = True
+            self.home[user] = slot
+            return slot
+
+    async def _release(self, slot: int):
+        async with self.slot_freed:
+            self.busy[slot] = False
+            self.slot_freed.notify_all()
+
+    async def _execute(self, slot: int, argv: list, attempts: int = 2):
+        """
+        Run one job on ``slot``. If its worker died (e.g. it was killed for
+        memory), the slot's pool is unusable: replace it and retry once.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(attempts):
+            pool = self.pools[slot]
+            try:
+                return await loop.run_in_executor(pool, run_ranking_job, argv)
+            except BrokenProcessPool:
+                if self.pools[slot] is pool:
+                    print(f"[scheduler] Worker {slot} died; starting a new one.", file=sys.stderr)
+                    self.pools[slot] = ProcessPoolExecutor(max_workers=1)
+                    pool.shutdown(wait=False)
+                if attempt == attempts - 1:
+                    raise
+
+    async def _run(self, user: str, job: dict, slot: int):
+        wait_ms = int(1000 * (time.monotonic() - job["submitted"]))
+        self.running += 1
+        self.write_status(user, {"state": "running", "wait_ms": wait_ms, **self.metrics()})
+
+        started = time.monotonic()
+        try:
+            rows = await self._execute(slot, job["argv"])
+            error = None
+        except Exception as e:  # reported through the status file
+            rows, error = None, e
+        finally:
+            self.running -= 1
+        run_ms = int(1000 * (time.monotonic() - started))
+
+        if user in self.pending:
+            # Superseded while running: a newer job owns the status now.
+            self.dropped += 1
+            return
+
+        self.completed += 1
+        if error is not None:
+            message = str(error) or type(error).__name__
+            self.write_status(user, {"state": "error", "error": message, **self.metrics()})
+            return
+
+        if job["result"] and job["latest"]:
+            try:
+                shutil.copyfile(job["result"], job["latest"])
+            except OSError as e:
+                print(f"[scheduler] Could not update latest result: {e}", file=sys.stderr)
+
+        status = {"state": "done", "rows": rows, "wait_ms": wait_ms, "run_ms": run_ms, **self.metrics()}
+        if job["result"]:
+            status["result"] = os.path.basename(job["result"])
+        self.write_status(user, status)
+
+    async def serve(self, reader: asyncio.StreamReader):
+        """
+        Read JSON lines ``{"user": ..., "args": [...], "result": ..., "latest": ...}``
+        from ``reader`` until EOF, then wait for the queued work to finish.
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                msg = json.loads(line)
+                self.submit(msg["user"], msg["args"], msg.get("result"), msg.get("latest"))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[scheduler] Ignoring bad request {line!r}: {e}", file=sys.stderr)
+
+        while self.workers:
+            await asyncio.gather(*list(self.workers.values()))
+        for pool in self.pools:
+            pool.shutdown()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Coalescing ranking scheduler (JSON lines on stdin)")
+    p.add_argument("--status-dir", required=True, help="Directory holding <user>_status.json files")
+    p.add_argument("--workers", type=int, default=2, help="Maximum concurrent ranking jobs")
+    return p.parse_args()
+
+
+async def _main(args):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    await RankingScheduler(args.status_dir, max_workers=args.workers).serve(reader)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(parse_args()))
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+class ThresholdIndex:
+    """
+    Per-column sorted access lists for Fagin's Threshold Algorithm (TA).
+
+    Each numeric ranking column is kept as an argsort in its better-first
+    direction (``higher_is_better[col]``), with missing values last. A
+    top-K query walks all lists in lock-step, scores every newly seen row by
+    random access, and stops as soon as the K-th best score beats the
+    threshold: the best score any row not seen yet could still reach.
+
+    The index is built once per dataset. Queries take the normalization
+    ``bounds`` ({column: (min, max)}) of the rows being ranked, so a
+    hard-filtered subset can be ranked against its own min-max scale; rows
+    outside ``mask`` are skipped at random access.
+    """
+
+    def __init__(self, df: pd.DataFrame, higher_is_better: dict):
+        self.index = df.index
+        self.columns = list(higher_is_better)
+        self.higher_is_better = dict(higher_is_better)
+
+        self.values = {}
+        self.orders = {}
+        for col in self.columns:
+            s_num = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            oriented = s_num.copy() if self.higher_is_better[col] else -s_num
+            oriented[np.isnan(oriented)] = -np.inf
+            self.values[col] = s_num
+            self.orders[col] = np.argsort(-oriented, kind="stable")
+
+    def _contribution(self, col, w, mn, mx, rows):
+        # Same scale as normalize_numeric; missing values contribute 0.
+        base = (self.values[col][rows] - mn) / (mx - mn)
+        if not self.higher_is_better[col]:
+            base = 1.0 - base
+        return np.nan_to_num(w * base, nan=0.0)
+
+    def top_k(self, weights: dict, k: int, bounds: dict, mask=None, batch: int = 32):
+        """
+        Row positions that can make the top ``k`` of ``sum(w * normalized)``.
+
+        ``weights`` maps index columns to non-negative weights. Columns whose
+        ``bounds`` are flat contribute a constant and are ignored. Every row
+        whose score is within float32 rounding of the K-th best is returned (in
+        position order), so the caller can rescore them exactly and break
+        ties the same way a full sort would.
+        """
+        n = len(self.index)
+        if mask is None:
+            mask = np.ones(n, dtype=bool)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        active = []
+        for col, w in weights.items():
+            if w < 0:
+                raise ValueError(f"Threshold queries need non-negative weights; got {col}={w}.")
+            mn, mx = bounds[col]
+            if w > 0 and mx != mn:
+                active.append((col, float(w), mn, mx))
+
+        if not active:
+            # Every row scores the same constant: a stable sort keeps frame order.
+            return np.flatnonzero(mask)[:k]
+
+        # Scores here are float64 estimates; the exact scores normalize
+        # float32 columns in float32. Keep every row within float32 rounding
+        # of the K-th score so ties are decided by the exact rescoring.
+        tol = 1e-6 * (sum(w for _, w, _, _ in active) + 1.0)
+
+        seen = np.zeros(n, dtype=bool)
+        cand_rows, cand_scores = [], []
+        depth, step = 0, max(batch, k)
+
+        while depth < n:
+            stop = min(n, depth + step)
+
+            new_rows = np.unique(np.concatenate([self.orders[col][depth:stop] for col, *_ in active]))
+            new_rows = new_rows[~seen[new_rows]]
+            seen[new_rows] = True
+            new_rows = new_rows[mask[new_rows]]
+
+            if len(new_rows):
+                score = np.zeros(len(new_rows))
+                for col, w, mn, mx in active:
+                    score += self._contribution(col, w, mn, mx, new_rows)
+                cand_rows.append(new_rows)
+                cand_scores.append(score)
+
+            # Best score an unseen (masked) row could reach: the last values
+            # read from each list, clipped to the range a masked row can take.
+            threshold = 0.0
+            for col, w, mn, mx in active:
+                last = np.array([self.orders[col][stop - 1]])
+                threshold += float(np.clip(self._contribution(col, w, mn, mx, last), 0.0, w)[0])
+
+            depth, step = stop, 2 * step
+
+            if cand_rows:
+                scores = np.concatenate(cand_scores)
+                if len(scores) >= k:
+                    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+                    if kth > threshold + tol:
+                        break
+
+        if not cand_rows:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.concatenate(cand_rows)
+        scores = np.concatenate(cand_scores)
+        if len(scores) > k:
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            rows = rows[scores >= kth - tol]
+        return np.sort(rows)
@@ -2,6 +2,23 @@
 import pandas as pd
 import numpy as np
 
+
+# Columns where larger is better
+UP_BETTER = {
+    "accuracy", "precision", "recall", "f1_score",
+    "epochs", "RAM", "batch_size", "pool_size", "kernel_size",
+    "layers", "nodes"
+}
+# Columns where smaller is better
+DOWN_BETTER = {"loss", "training_time"}
+
+
+def higher_is_better(col: str) -> bool:
+    """Ranking direction of a numeric column (unknown columns count as ↑)."""
+    cname = col if col in UP_BETTER or col in DOWN_BETTER else col.lower()
+    return (cname in UP_BETTER) or (cname not in DOWN_BETTER)
+
+
 class Utils:
     @staticmethod
     def _resolve_col(df: pd.DataFrame, key: str):
@@ -60,64 +77,99 @@ class Utils:
                 # Unknown column → skip this constraint gracefully
                 continue
 
-            s = df[col]
+            mask = Utils.constraint_mask(df[col], cond)
+            if mask is not None:
+                df = df[mask]
 
-            # ---------- Range-like [low, high] ----------
-            if isinstance(cond, (list, tuple)) and len(cond) == 2:
-                low, high = cond
+        return df
 
-                # Try numeric compare when possible
-                sn = pd.to_numeric(s, errors="coerce")
-                numericish = sn.notna().any()
+    @staticmethod
+    def constraint_mask(s: pd.Series, cond, numericish=None):
+        """
+        Boolean mask of the rows in ``s`` that satisfy a single constraint
+        (formats as in ``filter_dataFrame``), or None when the constraint
+        cannot be applied and should be skipped.
 
-                if numericish:
-                    mask = pd.Series(True, index=df.index)
-                    if low is not None:
-                        try:
-                            mask &= sn >= float(low)
-                        except (TypeError, ValueError):
-                            pass
-                    if high is not None:
-                        try:
-                            mask &= sn <= float(high)
-                        except (TypeError, ValueError):
-                            pass
-                    df = df[mask]
-                    continue
-
-                # Non-numeric equality encoded as [v, v]
-                if low is not None and high is not None and str(low) == str(high):
-                    df = df[s.astype(str) == str(low)]
-                    continue
-
-                # Otherwise, skip silently (cannot apply)
-                continue
+        ``numericish`` overrides whether a [low, high] range is compared
+        numerically; by default this is decided on ``s`` itself.
+        """
+        # ---------- Range-like [low, high] ----------
+        if isinstance(cond, (list, tuple)) and len(cond) == 2:
+            low, high = cond
 
-            # ---------- List/tuple of categories (not a 2-range) ----------
-            if isinstance(cond, (list, tuple)):
-                wanted = set(str(x) for x in cond)
-                df = df[s.astype(str).isin(wanted)]
-                continue
+            # Try numeric compare when possible
+            sn = pd.to_numeric(s, errors="coerce")
+            if numericish is None:
+                numericish = sn.notna().any()
 
-            # ---------- Scalar equality ----------
-            df = df[s.astype(str) == str(cond)]
+            if numericish:
+                mask = pd.Series(True, index=s.index)
+                if low is not None:
+                    try:
+                        mask &= sn >= float(low)
+                    except (TypeError, ValueError):
+                        pass
+                if high is not None:
+                    try:
+                        mask &= sn <= float(high)
+                    except (TypeError, ValueError):
+                        pass
+                return mask
+
+            # Non-numeric equality encoded as [v, v]
+            if low is not None and high is not None and str(low) == str(high):
+                return Utils._str_isin(s, {str(low)})
+
+            # Otherwise, skip silently (cannot apply)
+            return None
+
+        # ---------- List/tuple of categories (not a 2-range) ----------
+        if isinstance(cond, (list, tuple)):
+            wanted = set(str(x) for x in cond)
+            return Utils._str_isin(s, wanted)
+
+        # ---------- Scalar equality ----------
+        return Utils._str_isin(s, {str(cond)})
 
-        return df
+    @staticmethod
+    def _str_isin(s: pd.Series, wanted: set) -> pd.Series:
+        """
+        ``s.astype(str).isin(wanted)``; for ``category`` columns the test runs
+        on the (few) categories and is mapped through the integer codes, so
+        no per-row string copy is made.
+        """
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            hit = np.asarray([str(c) in wanted for c in s.cat.categories], dtype=bool)
+            codes = s.cat.codes.to_numpy()
+            mask = np.zeros(len(s), dtype=bool)
+            valid = codes >= 0
+            mask[valid] = hit[codes[valid]]
+            return pd.Series(mask, index=s.index)
+        return s.astype(str).isin(wanted)
 
 
-def normalize_numeric(s: pd.Series, higher_is_better: bool) -> pd.Series:
+def normalize_numeric(s: pd.Series, higher_is_better: bool, bounds=None) -> pd.Series:
     """
     Normalize a numeric series into [0, 1].
       • If all values NaN → zeros.
       • If all values equal (after coercion) → ones (so a weighted feature still contributes).
       • If higher_is_better is False, the scale is inverted.
+      • ``bounds=(min, max)`` reuses precomputed statistics instead of scanning
+        ``s`` (e.g. when scoring a subset against the full column's range).
     """
     s_num = pd.to_numeric(s, errors='coerce')
-    if s_num.isna().all():
-        return pd.Series(np.zeros(len(s_num)), index=s_num.index)
+    if s_num.dtype.kind in 'iu':
+        # Downcast integer columns (int8/int16) would overflow in s - mn
+        s_num = s_num.astype('float64')
+    if bounds is None:
+        if s_num.isna().all():
+            return pd.Series(np.zeros(len(s_num)), index=s_num.index)
+        mn = np.nanmin(s_num.values)
+        mx = np.nanmax(s_num.values)
+    else:
+        # Stay in the column's own precision (e.g. float32), like the scan above
+        mn, mx = (s_num.dtype.type(b) for b in bounds)
 
-    mn = np.nanmin(s_num.values)
-    mx = np.nanmax(s_num.values)
     if mx == mn:
         # Flat series – give neutral ones so weight contributes uniformly
         out = pd.Series(np.ones(len(s_num)), index=s_num.index)
@@ -125,3 +177,23 @@ def normalize_numeric(s: pd.Series, higher_is_better: bool) -> pd.Series:
 
     base = (s_num - mn) / (mx - mn)
     return base if higher_is_better else (1.0 - base)
+
+
+def range_bounds(cond):
+    """
+    [low, high] of a range constraint as floats, open ends at ±inf (entries
+    that are not numbers are ignored, as in the filter). A scalar gives
+    [v, v]; other lists/sets give None.
+    """
+    if isinstance(cond, (list, tuple)):
+        if len(cond) != 2:
+            return None
+    else:
+        cond = (cond, cond)
+    out = []
+    for value, default in zip(cond, (-np.inf, np.inf)):
+        try:
+            out.append(default if value is None else float(value))
+        except (TypeError, ValueError):
+            out.append(default)
+    return out